@@ -1,5 +1,16 @@
 import sys
 import os
+import math
+import time
+import json
+import hashlib
+import itertools
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import cv2
 import numpy as np
 from PySide6.QtWidgets import (
@@ -7,7 +18,8 @@ from PySide6.QtWidgets import (
     QGraphicsPixmapItem, QListWidget, QListWidgetItem, QPushButton,
     QVBoxLayout, QHBoxLayout, QWidget, QLabel, QToolBar, QStatusBar,
     QDockWidget, QGraphicsItem, QSizePolicy, QCheckBox, QDoubleSpinBox,
-    QFormLayout, QGroupBox, QGraphicsSceneMouseEvent # << AJOUTER ICI
+    QFormLayout, QGroupBox, QGraphicsSceneMouseEvent, # << AJOUTER ICI
+    QSlider, QComboBox, QDialog, QDialogButtonBox, QSpinBox, QLineEdit
 )
 # MODIFICATION ICI: Ajout de QIcon (et QPainter, QSize étaient déjà là)
 from PySide6.QtGui import (
@@ -15,7 +27,8 @@ from PySide6.QtGui import (
     QPainter, QIcon
 )
 from PySide6.QtCore import (
-    Qt, QRectF, QPointF, Signal, QSize, QItemSelectionModel
+    Qt, QRectF, QPointF, Signal, QSize, QItemSelectionModel, QThread, QBuffer, QByteArray, QIODevice,
+    QFileSystemWatcher, QTimer
 )
 
 # --- Constantes ---
@@ -28,13 +41,831 @@ STEP_QUICK_SCALE = 0.1
 STEP_PRECISE_SCALE = 0.01
 STEP_QUICK_ROTATE = 15
 STEP_PRECISE_ROTATE = 1
+HARMONIZE_STATS_MAX_SIDE = 256 # Taille max (px) des copies réduites pour les statistiques couleur
+PREVIEW_MAX_SIDE = 2048 # Taille max (px) du proxy utilisé pour l'aperçu à l'écran
+STAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024 # Mémoire max des résultats intermédiaires d'ajustements
+ADJUSTMENT_ORDER = ('crop', 'resize', 'brightness_contrast', 'blur', 'sharpen')
+LAYOUT_MODES = (('grid', "Grille"), ('justified', "Rangées justifiées"), ('binpack', "Empaquetage"))
+LAYERED_EXPORT_IN_FLIGHT = 3 # Calques rendus/encodés simultanément lors de l'export en calques (borne la mémoire)
+ORA_THUMBNAIL_SIZE = 256
+FILE_WATCH_DEBOUNCE_MS = 300 # Délai sans nouvel événement avant de recharger un fichier modifié
+COMPOSITE_EXPORT_MAX_BYTES = 2 * 1024 * 1024 * 1024 # Budget mémoire de l'export composite pleine résolution
+COMPOSITE_EXPORT_FORMATS = { # Filtre du dialogue -> profondeur de sortie
+    "PNG Image (*.png)": np.uint8,
+    "JPEG Image (*.jpg)": np.uint8,
+    "PNG 16 bits (*.png)": np.uint16,
+    "TIFF 16 bits (*.tif *.tiff)": np.uint16,
+    "TIFF 32 bits flottant (*.tif *.tiff)": np.float32,
+}
+RENDER_SERVICE_PORT = 8765
+RENDER_SERVICE_WORKERS = 4
+RENDER_SERVICE_SOURCE_CACHE_BYTES = 1024 * 1024 * 1024 # Images sources décodées
+RENDER_SERVICE_RESULT_CACHE_BYTES = 256 * 1024 * 1024 # Rendus encodés (PNG)
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+FRAME_PICK_MODES = (('every_nth', "Toutes les N images"), ('scene_change', "Changements de plan"),
+                    ('timestamps', "Instants précis"))
+
+
+def compute_lab_stats(cv_image, max_side=HARMONIZE_STATS_MAX_SIDE):
+    """
+    Calcule la moyenne et l'écart-type par canal dans l'espace Lab (perceptuel)
+    sur une copie réduite de l'image BGR. Retourne (mean, std), deux tableaux de 3 valeurs.
+    """
+    h, w = cv_image.shape[:2]
+    factor = max_side / max(h, w)
+    if factor < 1.0:
+        small = cv2.resize(cv_image, (max(1, int(w * factor)), max(1, int(h * factor))),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        small = cv_image
+    lab = cv2.cvtColor(small, cv2.COLOR_BGR2LAB).reshape(-1, 3).astype(np.float32)
+    # Tuples (hachables) pour servir de paramètres d'étape dans le pipeline d'ajustements
+    return tuple(lab.mean(axis=0).tolist()), tuple(lab.std(axis=0).tolist())
+
+
+def build_harmonization_lut(src_stats, ref_stats, strength=1.0):
+    """
+    Construit une table de correspondance Lab (forme (1, 256, 3), uint8) qui ramène
+    la moyenne et l'écart-type de chaque canal de src_stats sur ceux de ref_stats.
+    strength (0..1) mélange la table avec l'identité.
+    """
+    src_mean, src_std = np.asarray(src_stats[0], np.float32), np.asarray(src_stats[1], np.float32)
+    ref_mean, ref_std = np.asarray(ref_stats[0], np.float32), np.asarray(ref_stats[1], np.float32)
+    x = np.arange(256, dtype=np.float32)[:, None] # (256, 1), diffusé sur les 3 canaux
+    gain = ref_std / np.maximum(src_std, 1e-3)
+    mapped = (x - src_mean) * gain + ref_mean
+    lut = x + (mapped - x) * strength
+    return np.clip(np.rint(lut), 0, 255).astype(np.uint8).reshape(1, 256, 3)
+
+
+def dtype_max(dtype):
+    """ Valeur du blanc pour une profondeur d'image : 255, 65535 ou 1.0 (flottant). """
+    if np.issubdtype(dtype, np.floating):
+        return 1.0
+    return float(np.iinfo(dtype).max)
+
+
+def normalize_source_depth(cv_image):
+    """ Profondeurs gérées : 8 bits, 16 bits et flottant 32 bits. Les autres passent en flottant. """
+    if cv_image.dtype in (np.uint8, np.uint16, np.float32):
+        return cv_image
+    return (cv_image.astype(np.float32) / dtype_max(cv_image.dtype)).astype(np.float32)
+
+
+def read_source_image(path, keep_depth=False):
+    """
+    Décode une image source en BGR. Avec keep_depth, la profondeur d'origine
+    (16 bits, flottant) est conservée. Retourne None si le décodage échoue.
+    """
+    if keep_depth:
+        return cv2.imread(path, cv2.IMREAD_COLOR | cv2.IMREAD_ANYDEPTH)
+    return cv2.imread(path)
+
+
+def to_uint8(image):
+    """ Conversion vers 8 bits pour l'affichage (sans copie si l'image est déjà en 8 bits). """
+    if image.dtype == np.uint8:
+        return image
+    white = dtype_max(image.dtype)
+    if np.issubdtype(image.dtype, np.floating):
+        # Écrêtage : les valeurs négatives (HDR, EXR) deviennent noires au lieu d'être réfléchies
+        return np.clip(image * (255.0 / white) + 0.5, 0, 255).astype(np.uint8)
+    return cv2.convertScaleAbs(image, alpha=255.0 / white) # Entiers non signés : jamais négatifs
+
+
+def rgb_array_to_qpixmap(rgb_image):
+    """ Convertit un tableau RGB (h, w, 3) en QPixmap 8 bits (copie profonde). """
+    h, w, ch = rgb_image.shape
+    rgb_image = np.ascontiguousarray(to_uint8(rgb_image))
+    q_image = QImage(rgb_image.data, w, h, ch * w, QImage.Format.Format_RGB888)
+    return QPixmap.fromImage(q_image) # fromImage copie les données
+
+
+def is_video_file(filename):
+    return os.path.splitext(filename)[1].lower() in VIDEO_EXTENSIONS
+
+
+def _scene_histogram(frame):
+    """ Histogramme teinte/saturation normalisé d'une copie très réduite de l'image. """
+    small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256])
+    return cv2.normalize(hist, hist)
+
+
+def iter_video_frames(path, mode='every_nth', step=30, threshold=0.5, timestamps=(),
+                      max_frames=MAX_IMAGES, should_stop=None):
+    """
+    Parcourt une vidéo en flux et produit (image BGR, instant en secondes) pour chaque
+    image retenue. Au plus max_frames images sont produites et seule l'image courante
+    est décodée en mémoire : la consommation ne dépend pas de la durée de la vidéo.
+    - 'every_nth' : une image toutes les `step` ; les autres sont sautées sans décodage (grab).
+    - 'scene_change' : images dont l'histogramme diffère de la précédente de plus de `threshold`
+      (distance de Bhattacharyya, 0..1).
+    - 'timestamps' : images aux instants donnés (secondes).
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError(f"Impossible d'ouvrir la vidéo {path} avec OpenCV.")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        kept = 0
+        if mode == 'timestamps':
+            for seconds in sorted(timestamps):
+                if kept >= max_frames or (should_stop and should_stop()):
+                    return
+                capture.set(cv2.CAP_PROP_POS_MSEC, seconds * 1000.0)
+                ok, frame = capture.read()
+                if not ok:
+                    continue
+                yield frame, seconds
+                kept += 1
+            return
+
+        index = 0
+        previous_hist = None
+        while kept < max_frames:
+            if should_stop and should_stop():
+                return
+            if mode == 'every_nth' and index % step:
+                if not capture.grab():
+                    return
+                index += 1
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                return
+            if mode == 'scene_change':
+                hist = _scene_histogram(frame)
+                is_cut = previous_hist is None or \
+                    cv2.compareHist(previous_hist, hist, cv2.HISTCMP_BHATTACHARYYA) > threshold
+                previous_hist = hist
+                if not is_cut:
+                    index += 1
+                    continue
+            yield frame, index / fps
+            kept += 1
+            index += 1
+    finally:
+        capture.release()
+
+
+# --- Export en calques (OpenRaster) ---
+
+def render_layer_png(bgr_image, affine_matrix, size):
+    """
+    Projette une image BGR dans l'espace du canevas (matrice affine 2x3 item -> calque)
+    sur un calque BGRA transparent de taille `size` (largeur, hauteur), puis l'encode en PNG.
+    Pur OpenCV/numpy : exécutable dans un thread de travail.
+    """
+    if bgr_image.dtype == np.float32:
+        # PNG : 8 ou 16 bits seulement
+        bgr_image = np.clip(bgr_image * 65535.0 + 0.5, 0, 65535).astype(np.uint16)
+    bgra = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2BGRA)
+    layer = cv2.warpAffine(bgra, np.asarray(affine_matrix, np.float64), size,
+                           flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0, 0))
+    del bgra
+    ok, png = cv2.imencode('.png', layer)
+    if not ok:
+        raise ValueError("Échec de l'encodage PNG du calque.")
+    return png.tobytes()
+
+
+def write_openraster(path, canvas_size, layers, executor, merged_png, thumbnail_png=None,
+                     max_in_flight=LAYERED_EXPORT_IN_FLIGHT):
+    """
+    Écrit un fichier OpenRaster 0.0.5 (zip + PNG). `layers` liste, du plus en arrière au plus
+    en avant, des tuples (nom, x, y, render) où render() retourne le PNG du calque.
+    `merged_png` est l'image aplatie à la taille du canevas (mergedimage.png, obligatoire).
+    Les calques sont rendus en parallèle par `executor` mais au plus `max_in_flight`
+    sont en mémoire à la fois ; chacun est écrit dans l'archive dès qu'il est prêt.
+    """
+    width, height = canvas_size
+    with zipfile.ZipFile(path, 'w') as archive:
+        # Le type MIME doit être la première entrée, non compressée
+        archive.writestr(zipfile.ZipInfo('mimetype'), 'image/openraster', compress_type=zipfile.ZIP_STORED)
+
+        pending = deque()
+
+        def write_oldest():
+            src, future = pending.popleft()
+            # PNG déjà compressé : stocké tel quel
+            archive.writestr(src, future.result(), compress_type=zipfile.ZIP_STORED)
+
+        stack_entries = []
+        for index, (name, x, y, render) in enumerate(layers):
+            src = f"data/layer{index:03d}.png"
+            stack_entries.append((name, x, y, src))
+            pending.append((src, executor.submit(render)))
+            if len(pending) >= max_in_flight:
+                write_oldest()
+        while pending:
+            write_oldest()
+
+        image_el = ET.Element('image', version='0.0.5', w=str(width), h=str(height))
+        stack_el = ET.SubElement(image_el, 'stack')
+        for name, x, y, src in reversed(stack_entries): # OpenRaster : premier élément = plus en avant
+            ET.SubElement(stack_el, 'layer', name=name, src=src, x=str(x), y=str(y),
+                          opacity='1.0', visibility='visible')
+        archive.writestr('stack.xml', ET.tostring(image_el, encoding='utf-8', xml_declaration=True),
+                         compress_type=zipfile.ZIP_DEFLATED)
+        archive.writestr('mergedimage.png', merged_png, compress_type=zipfile.ZIP_STORED)
+        if thumbnail_png is not None:
+            archive.writestr('Thumbnails/thumbnail.png', thumbnail_png, compress_type=zipfile.ZIP_STORED)
+
+
+# --- Service de rendu local ---
+
+def item_affine_matrix(width, height, x, y, scale, rotation):
+    """
+    Matrice affine 2x3 (image -> scène) du modèle de DraggableResizablePixmapItem :
+    position (x, y), puis échelle et rotation (degrés, sens horaire) autour du centre.
+    """
+    cos_a = math.cos(math.radians(rotation)) * scale
+    sin_a = math.sin(math.radians(rotation)) * scale
+    cx, cy = width / 2.0, height / 2.0
+    return np.array([[cos_a, -sin_a, x + cx - (cos_a * cx - sin_a * cy)],
+                     [sin_a, cos_a, y + cy - (sin_a * cx + cos_a * cy)]], np.float64)
+
+
+def _layer_box(image, matrix):
+    """ Rectangle englobant entier (x0, y0, x1, y1) d'une image projetée par `matrix`. """
+    h, w = image.shape[:2]
+    corners = np.array([[0, 0, 1], [w, 0, 1], [0, h, 1], [w, h, 1]], np.float64) @ matrix.T
+    x0, y0 = np.floor(corners.min(axis=0)).astype(int)
+    x1, y1 = np.ceil(corners.max(axis=0)).astype(int)
+    return x0, y0, x1, y1
+
+
+def composite_layers(layers, dtype=np.uint8, canvas_rect=None, executor=None):
+    """
+    Compose des calques (image BGR, matrice affine 2x3) du plus en arrière au plus en avant
+    sur un canevas BGRA transparent couvrant tous les calques. Chaque calque n'est projeté
+    que sur son propre rectangle englobant. Les calques peuvent être de profondeurs
+    différentes ; le résultat est dans la profondeur `dtype`.
+    Avec `canvas_rect` (x, y, largeur, hauteur), l'image d'un calque peut être une fonction
+    sans argument qui la calcule : les calques sont alors rendus un par un (le suivant est
+    préparé dans `executor` pendant la composition du courant) et jamais tous gardés en mémoire.
+    Mémoire : canevas flottant de 16 octets/pixel + un calque à la fois (deux avec `executor`).
+    """
+    if canvas_rect is None:
+        boxes = [_layer_box(image, matrix) for image, matrix in layers]
+        canvas_x = min(b[0] for b in boxes)
+        canvas_y = min(b[1] for b in boxes)
+        canvas_w = max(b[2] for b in boxes) - canvas_x
+        canvas_h = max(b[3] for b in boxes) - canvas_y
+    else:
+        canvas_x, canvas_y, canvas_w, canvas_h = canvas_rect
+    canvas = np.zeros((canvas_h, canvas_w, 4), np.float32)
+
+    pending = None
+    for index, (source, matrix) in enumerate(layers):
+        if callable(source) and executor is not None:
+            future = pending or executor.submit(source)
+            following = layers[index + 1][0] if index + 1 < len(layers) else None
+            pending = executor.submit(following) if callable(following) else None
+            image = future.result()
+        else:
+            image = source() if callable(source) else source
+        x0, y0, x1, y1 = _layer_box(image, matrix)
+        # Rectangle du calque limité au canevas
+        x0, y0 = max(x0, canvas_x), max(y0, canvas_y)
+        x1, y1 = min(x1, canvas_x + canvas_w), min(y1, canvas_y + canvas_h)
+        if x1 <= x0 or y1 <= y0:
+            continue
+        local = matrix.copy()
+        local[:, 2] -= (x0, y0)
+        layer = cv2.warpAffine(cv2.cvtColor(image, cv2.COLOR_BGR2BGRA), local, (x1 - x0, y1 - y0),
+                               flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0, 0))
+        layer = layer.astype(np.float32) * (1.0 / dtype_max(layer.dtype))
+        alpha = layer[:, :, 3:4]
+        roi = canvas[y0 - canvas_y:y1 - canvas_y, x0 - canvas_x:x1 - canvas_x]
+        # Opérateur "over" (couleurs non prémultipliées)
+        out_alpha = alpha + roi[:, :, 3:4] * (1.0 - alpha)
+        out_color = layer[:, :, :3] * alpha + roi[:, :, :3] * roi[:, :, 3:4] * (1.0 - alpha)
+        roi[:, :, :3] = np.divide(out_color, out_alpha, out=np.zeros_like(out_color), where=out_alpha > 0)
+        roi[:, :, 3:4] = out_alpha
+        del image, layer # Libérer le calque avant de rendre le suivant
+    if np.issubdtype(dtype, np.floating):
+        return canvas.astype(dtype, copy=False)
+    white = dtype_max(dtype)
+    return np.clip(canvas * white + 0.5, 0, white).astype(dtype)
+
+
+class RenderService:
+    """
+    Rend des compositions décrites en JSON avec un pool de workers :
+    {"layers": [{"source": chemin, "x": 0, "y": 0, "scale": 1.0, "rotation": 0, "z": 1,
+                 "adjustments": [["blur", {"sigma": 2}], ...]}, ...],
+     "output": chemin optionnel du fichier à écrire}
+    x/y/scale/rotation/z suivent le modèle de DraggableResizablePixmapItem (pos, échelle
+    et rotation autour du centre, Z-order). Les sources décodées sont gardées dans un
+    cache LRU et les rendus dans un cache indexé par le hash de la description.
+    "output" n'est accepté que s'il désigne un fichier de `output_dir` (désactivé si None).
+    """
+    def __init__(self, workers=RENDER_SERVICE_WORKERS,
+                 source_cache_bytes=RENDER_SERVICE_SOURCE_CACHE_BYTES,
+                 result_cache_bytes=RENDER_SERVICE_RESULT_CACHE_BYTES,
+                 output_dir=None):
+        self.output_dir = os.path.realpath(output_dir) if output_dir else None
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.source_cache = StageCache(source_cache_bytes)
+        self.result_cache = StageCache(result_cache_bytes)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.source_cache_hits = 0
+        self.result_cache_hits = 0
+        self.latencies = deque(maxlen=1000) # Secondes, de la soumission à la fin du rendu
+
+    def submit(self, layout):
+        # Chemin de sortie validé avant toute mise en file : un refus ne coûte aucun rendu
+        output_path = self.resolve_output(layout['output']) if layout.get('output') else None
+        with self._lock:
+            self.queued += 1
+        return self.pool.submit(self._run, layout, output_path, time.perf_counter())
+
+    def _run(self, layout, output_path, submitted_at):
+        with self._lock:
+            self.queued -= 1
+            self.in_flight += 1
+        try:
+            png = self.render(layout, output_path)
+        except Exception:
+            with self._lock:
+                self.in_flight -= 1
+                self.failed += 1
+            raise
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1 # Rendus réussis uniquement
+            self.latencies.append(time.perf_counter() - submitted_at)
+        return png
+
+    def resolve_output(self, path):
+        """
+        Chemin réel du fichier de sortie, qui doit se trouver dans output_dir.
+        Un chemin relatif est pris relativement à output_dir.
+        """
+        if self.output_dir is None:
+            raise PermissionError("L'écriture de fichiers est désactivée (aucun répertoire de sortie configuré).")
+        resolved = os.path.realpath(os.path.join(self.output_dir, path))
+        if os.path.commonpath([resolved, self.output_dir]) != self.output_dir or resolved == self.output_dir:
+            raise PermissionError(f"Chemin de sortie refusé (hors de {self.output_dir}): {path}")
+        return resolved
+
+    def load_source(self, path):
+        """ Image BGR décodée, via le cache (invalidé si le fichier change). """
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        image = self.source_cache.get(key)
+        if image is not None:
+            with self._lock:
+                self.source_cache_hits += 1
+            return image
+        image = cv2.imread(path)
+        if image is None:
+            raise IOError(f"Impossible de charger l'image {path} avec OpenCV.")
+        if len(image.shape) == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        self.source_cache.put(key, image)
+        return image
+
+    def render(self, layout, output_path=None):
+        """
+        Retourne le PNG (tableau uint8 encodé) de la composition décrite par `layout`
+        et l'écrit dans `output_path` (déjà validé par resolve_output) s'il est fourni.
+        """
+        layer_specs = sorted(layout['layers'], key=lambda spec: spec.get('z', 0))
+        if not layer_specs:
+            raise ValueError("La composition ne contient aucun calque.")
+        # Le hash inclut l'état des fichiers sources pour invalider le rendu s'ils changent
+        sources_state = [(spec['source'], os.stat(spec['source']).st_mtime_ns) for spec in layer_specs]
+        key = stage_key(json.dumps(layer_specs, sort_keys=True), 'render', {'sources': tuple(sources_state)})
+        png = self.result_cache.get(key)
+        if png is not None:
+            with self._lock:
+                self.result_cache_hits += 1
+        else:
+            layers = []
+            for spec in layer_specs:
+                image = self.load_source(spec['source'])
+                for name, params in spec.get('adjustments', ()):
+                    image = ADJUSTMENT_OPERATIONS[name](image, params, 1.0)
+                h, w = image.shape[:2]
+                matrix = item_affine_matrix(w, h, spec.get('x', 0.0), spec.get('y', 0.0),
+                                            spec.get('scale', 1.0), spec.get('rotation', 0.0))
+                layers.append((image, matrix))
+            ok, png = cv2.imencode('.png', composite_layers(layers))
+            if not ok:
+                raise ValueError("Échec de l'encodage PNG du rendu.")
+            self.result_cache.put(key, png)
+        if output_path is not None:
+            with open(output_path, 'wb') as f:
+                f.write(png.tobytes())
+        return png
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            metrics = {
+                'queue_depth': self.queued,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'failed': self.failed,
+                'source_cache_hits': self.source_cache_hits,
+                'source_cache_bytes': self.source_cache.current_bytes,
+                'result_cache_hits': self.result_cache_hits,
+                'result_cache_bytes': self.result_cache.current_bytes,
+            }
+        if latencies:
+            metrics['latency_mean_s'] = sum(latencies) / len(latencies)
+            metrics['latency_p50_s'] = latencies[len(latencies) // 2]
+            metrics['latency_p95_s'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return metrics
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+class _RenderRequestHandler(BaseHTTPRequestHandler):
+    """ POST /render : description JSON -> PNG (ou JSON si "output" est fourni). GET /metrics. """
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _check_request(self):
+        """
+        Refuse les requêtes qui ne visent pas explicitement ce service local : l'en-tête Host
+        doit être localhost/127.0.0.1 (protection contre le DNS rebinding). Retourne False
+        si une réponse d'erreur a été envoyée.
+        """
+        host = self.headers.get('Host', '')
+        if host not in self.server.allowed_hosts:
+            self._send_json(403, {'error': 'host not allowed'})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._check_request():
+            return
+        if self.path == '/metrics':
+            self._send_json(200, self.server.render_service.metrics())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if not self._check_request():
+            return
+        if self.path != '/render':
+            self._send_json(404, {'error': 'not found'})
+            return
+        # application/json n'est pas un type "simple" : un navigateur doit faire un
+        # pré-contrôle CORS, auquel ce service ne répond pas. Les formulaires et POST
+        # "simples" d'une page web sont donc refusés.
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type != 'application/json':
+            self._send_json(415, {'error': 'Content-Type must be application/json'})
+            return
+        try:
+            layout = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            png = self.server.render_service.submit(layout).result()
+        except PermissionError as e:
+            self._send_json(403, {'error': str(e)})
+            return
+        except Exception as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        if layout.get('output'):
+            self._send_json(200, {'output': layout['output']})
+            return
+        body = png.tobytes()
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[DEBUG] RenderService: {self.address_string()} {format % args}")
+
+
+def serve_render_service(port=RENDER_SERVICE_PORT, workers=RENDER_SERVICE_WORKERS, output_dir=None):
+    """ Lance le service de rendu sur localhost (bloquant). """
+    service = RenderService(workers=workers, output_dir=output_dir)
+    server = ThreadingHTTPServer(('127.0.0.1', port), _RenderRequestHandler)
+    server.render_service = service
+    server.allowed_hosts = {f"{name}:{port}" for name in ('127.0.0.1', 'localhost')}
+    if port == 80:
+        server.allowed_hosts |= {'127.0.0.1', 'localhost'}
+    print(f"[INFO] Service de rendu en écoute sur http://127.0.0.1:{port} (POST /render, GET /metrics)")
+    print(f"[INFO] Répertoire de sortie: {service.output_dir or 'aucun (champ output refusé)'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+# --- Disposition automatique (collage) ---
+# Les fonctions ci-dessous ne travaillent que sur les dimensions (largeur, hauteur)
+# des images : aucun pixel n'est lu. Elles retournent, pour chaque image, la position
+# (x, y) de son coin supérieur gauche et son facteur d'échelle.
+
+def _uniform_scales(sizes, uniform_scale):
+    if not uniform_scale:
+        return [1.0] * len(sizes)
+    # Toutes les images ramenées à la hauteur médiane
+    reference_height = float(np.median([h for _, h in sizes]))
+    return [reference_height / h for _, h in sizes]
+
+
+def layout_grid(sizes, aspect_ratio, spacing=0.0, uniform_scale=True):
+    """ Grille régulière : cellules de la taille de la plus grande image, images centrées. """
+    scales = _uniform_scales(sizes, uniform_scale)
+    cell_w = max(w * sc for (w, _), sc in zip(sizes, scales))
+    cell_h = max(h * sc for (_, h), sc in zip(sizes, scales))
+    n = len(sizes)
+    cols = max(1, min(n, int(round(math.sqrt(n * aspect_ratio * (cell_h + spacing) / (cell_w + spacing))))))
+    placements = []
+    for i, ((w, h), sc) in enumerate(zip(sizes, scales)):
+        row, col = divmod(i, cols)
+        x = col * (cell_w + spacing) + (cell_w - w * sc) / 2
+        y = row * (cell_h + spacing) + (cell_h - h * sc) / 2
+        placements.append((x, y, sc))
+    return placements
+
+
+def layout_justified(sizes, aspect_ratio, spacing=0.0, uniform_scale=True):
+    """
+    Rangées justifiées : les images d'une rangée partagent la même hauteur et la rangée
+    remplit exactement la largeur cible. La mise à l'échelle est inhérente au mode.
+    """
+    aspects = [w / h for w, h in sizes]
+    base_height = float(np.median([h for _, h in sizes]))
+    target_width = math.sqrt(sum(aspects) * base_height * base_height * aspect_ratio)
+    placements = [None] * len(sizes)
+    y = 0.0
+    start = 0
+    while start < len(sizes):
+        # Remplir la rangée jusqu'à dépasser la largeur cible à la hauteur de base
+        end = start
+        row_aspect = 0.0
+        while end < len(sizes):
+            row_aspect += aspects[end]
+            end += 1
+            if row_aspect * base_height + spacing * (end - start - 1) >= target_width:
+                break
+        gaps = spacing * (end - start - 1)
+        row_height = (target_width - gaps) / row_aspect
+        if end == len(sizes) and row_height > base_height:
+            row_height = base_height # Dernière rangée incomplète : pas d'agrandissement
+        x = 0.0
+        for i in range(start, end):
+            placements[i] = (x, y, row_height / sizes[i][1])
+            x += aspects[i] * row_height + spacing
+        y += row_height + spacing
+        start = end
+    return placements
+
+
+def layout_binpack(sizes, aspect_ratio, spacing=0.0, uniform_scale=True):
+    """
+    Empaquetage en étagères (First Fit Decreasing Height) : les images sont triées par
+    hauteur décroissante puis placées sur la première étagère qui a la place.
+    """
+    scales = _uniform_scales(sizes, uniform_scale)
+    scaled = [(w * sc, h * sc) for (w, h), sc in zip(sizes, scales)]
+    total_area = sum((w + spacing) * (h + spacing) for w, h in scaled)
+    bin_width = max(max(w for w, _ in scaled), math.sqrt(total_area * aspect_ratio))
+    order = sorted(range(len(scaled)), key=lambda i: scaled[i][1], reverse=True)
+    shelves = [] # [y, hauteur, x libre]
+    next_y = 0.0
+    placements = [None] * len(sizes)
+    for i in order:
+        w, h = scaled[i]
+        for shelf in shelves:
+            if shelf[2] + w <= bin_width:
+                break
+        else:
+            shelf = [next_y, h, 0.0]
+            shelves.append(shelf)
+            next_y += h + spacing
+        placements[i] = (shelf[2], shelf[0], scales[i])
+        shelf[2] += w + spacing
+    return placements
+
+
+LAYOUT_FUNCTIONS = {
+    'grid': layout_grid,
+    'justified': layout_justified,
+    'binpack': layout_binpack,
+}
+
+
+def compute_layout(sizes, mode='grid', aspect_ratio=1.5, spacing=0.0, uniform_scale=True):
+    """ Calcule une disposition (x, y, échelle) pour chaque taille (largeur, hauteur) donnée. """
+    if not sizes:
+        return []
+    return LAYOUT_FUNCTIONS[mode](sizes, aspect_ratio, spacing, uniform_scale)
+
+
+# --- Opérations d'ajustement (non destructives) ---
+# Chaque opération reçoit l'image BGR d'entrée, ses paramètres et le facteur
+# d'échelle de la résolution de travail (proxy < 1.0, original = 1.0) pour
+# adapter les paramètres exprimés en pixels de l'original.
+
+def _op_harmonize(image, params, scale):
+    if image.dtype == np.uint8:
+        lut = build_harmonization_lut(params['src'], params['ref'], params['strength'])
+        lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+        return cv2.cvtColor(cv2.LUT(lab, lut), cv2.COLOR_LAB2BGR)
+
+    # Haute profondeur : même transfert linéaire, appliqué en Lab flottant (pas de LUT 8 bits).
+    # Les statistiques sont exprimées dans les unités Lab 8 bits d'OpenCV (L 0..255, a/b décalés de 128).
+    white = dtype_max(image.dtype)
+    lab = cv2.cvtColor(image.astype(np.float32) * (1.0 / white), cv2.COLOR_BGR2LAB)
+    units = np.array([255.0 / 100.0, 1.0, 1.0], np.float32)
+    offset = np.array([0.0, 128.0, 128.0], np.float32)
+    lab = lab * units + offset
+    src_mean, src_std = np.asarray(params['src'][0], np.float32), np.asarray(params['src'][1], np.float32)
+    ref_mean, ref_std = np.asarray(params['ref'][0], np.float32), np.asarray(params['ref'][1], np.float32)
+    gain = ref_std / np.maximum(src_std, 1e-3)
+    lab += ((lab - src_mean) * gain + ref_mean - lab) * params['strength']
+    bgr = cv2.cvtColor((lab - offset) / units, cv2.COLOR_LAB2BGR)
+    if image.dtype == np.float32:
+        return np.maximum(bgr, 0.0)
+    return np.clip(bgr * white + 0.5, 0, white).astype(image.dtype)
+
+
+def _op_crop(image, params, scale):
+    # Marges exprimées en fraction de la largeur/hauteur : indépendantes de la résolution
+    h, w = image.shape[:2]
+    x0 = min(int(round(w * params['left'])), w - 1)
+    y0 = min(int(round(h * params['top'])), h - 1)
+    x1 = max(w - int(round(w * params['right'])), x0 + 1)
+    y1 = max(h - int(round(h * params['bottom'])), y0 + 1)
+    return np.ascontiguousarray(image[y0:y1, x0:x1])
+
+
+def _op_resize(image, params, scale):
+    h, w = image.shape[:2]
+    factor = params['factor']
+    interpolation = cv2.INTER_AREA if factor < 1.0 else cv2.INTER_CUBIC
+    return cv2.resize(image, (max(1, int(round(w * factor))), max(1, int(round(h * factor)))),
+                      interpolation=interpolation)
+
+
+def _op_brightness_contrast(image, params, scale):
+    # Calcul en flottant puis écrêtage : convertScaleAbs prendrait la valeur absolue
+    # et ferait "remonter" les ombres avec une luminosité négative.
+    # La luminosité est exprimée en niveaux 8 bits : mise à l'échelle pour la profondeur de l'image
+    white = dtype_max(image.dtype)
+    result = image.astype(np.float32) * params['contrast'] + params['brightness'] * white / 255.0
+    if image.dtype == np.float32:
+        return np.maximum(result, 0.0)
+    return np.clip(result + 0.5, 0, white).astype(image.dtype)
+
+
+def _op_blur(image, params, scale):
+    sigma = params['sigma'] * scale
+    if sigma <= 0:
+        return image
+    return cv2.GaussianBlur(image, (0, 0), sigma)
+
+
+def _op_sharpen(image, params, scale):
+    # Masque flou (unsharp mask)
+    blurred = cv2.GaussianBlur(image, (0, 0), max(0.5, 1.5 * scale))
+    amount = params['amount']
+    return cv2.addWeighted(image, 1.0 + amount, blurred, -amount, 0)
+
+
+ADJUSTMENT_OPERATIONS = {
+    'harmonize': _op_harmonize,
+    'crop': _op_crop,
+    'resize': _op_resize,
+    'brightness_contrast': _op_brightness_contrast,
+    'blur': _op_blur,
+    'sharpen': _op_sharpen,
+}
+
+
+def stage_key(input_key, name, params):
+    """ Clé de cache d'une étape : hash de la clé de son entrée, de l'opération et des paramètres. """
+    payload = repr((input_key, name, sorted(params.items())))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class StageCache:
+    """
+    Cache LRU des résultats intermédiaires du pipeline d'ajustements, borné en octets.
+    Partagé par tous les calques et utilisable depuis les threads de travail.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key) # Récemment utilisé
+            return image
+
+    def put(self, key, image):
+        if image.nbytes > self.max_bytes:
+            return # Trop gros pour être mis en cache
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = image
+            self.current_bytes += image.nbytes
+            # Éviction des entrées les moins récemment utilisées
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+STAGE_CACHE = StageCache(STAGE_CACHE_MAX_BYTES)
+_SOURCE_IDS = itertools.count() # Identifiants uniques des images sources (clés de cache)
+
+
+def prepare_source(cv_image):
+    """
+    Prépare le proxy d'aperçu d'une image source : retourne (proxy 8 bits, échelle du proxy).
+    Le proxy est réduit avant conversion en 8 bits pour ne jamais créer de copie pleine
+    taille de l'original. Pur OpenCV : exécutable dans un thread de travail.
+    """
+    h, w = cv_image.shape[:2]
+    proxy_scale = min(1.0, PREVIEW_MAX_SIDE / max(h, w))
+    if proxy_scale < 1.0:
+        proxy = to_uint8(cv2.resize(
+            cv_image, (max(1, int(round(w * proxy_scale))), max(1, int(round(h * proxy_scale)))),
+            interpolation=cv2.INTER_AREA
+        ))
+    else:
+        proxy = to_uint8(cv_image) # Pas de copie si l'image est déjà petite et en 8 bits
+    return proxy, proxy_scale
+
+
+def build_pipeline_stages(harmonize_stats, harmonize_target, harmonize_strength, adjustments):
+    """ Étapes du pipeline d'un calque : harmonisation éventuelle puis pile d'ajustements. """
+    stages = []
+    if harmonize_stats is not None and harmonize_target is not None and harmonize_strength > 0:
+        stages.append(('harmonize', {
+            'src': harmonize_stats,
+            'ref': harmonize_target,
+            'strength': harmonize_strength,
+        }))
+    return stages + list(adjustments)
+
+
+def run_pipeline(image, scale, source_id, stages):
+    """
+    Exécute les étapes sur `image`. Chaque étape est mémorisée dans STAGE_CACHE sous le hash
+    de la clé de son entrée et de ses paramètres : modifier un paramètre ne recalcule que
+    cette étape et les suivantes. Ne touche pas aux objets Qt.
+    La clé de départ inclut profondeur et forme de l'entrée : quand proxy_scale vaut 1.0,
+    le proxy 8 bits et l'original haute profondeur ne doivent pas partager leurs résultats.
+    """
+    key = (source_id, scale, image.dtype.str, image.shape)
+    for name, params in stages:
+        key = stage_key(key, name, params)
+        result = STAGE_CACHE.get(key)
+        if result is None:
+            result = ADJUSTMENT_OPERATIONS[name](image, params, scale)
+            STAGE_CACHE.put(key, result)
+        image = result
+    return image
+
 
 class DraggableResizablePixmapItem(QGraphicsPixmapItem):
     # itemSelected = Signal(object) # Supprimé, on utilise scene.selectionChanged
 
-    def __init__(self, pixmap, filename, original_cv_image):
+    def __init__(self, pixmap, filename, original_cv_image, source_path=None):
         super().__init__(pixmap)
         self.filename = filename
+        self.source_path = source_path # Chemin complet du fichier source (None pour une image vidéo)
         self.original_cv_image = original_cv_image
         self.setFlags(
             QGraphicsItem.GraphicsItemFlag.ItemIsSelectable |
@@ -47,11 +878,23 @@ class DraggableResizablePixmapItem(QGraphicsPixmapItem):
 
         self._is_active = False # Pour le contour
 
+        # Pile d'ajustements non destructive : original_cv_image n'est jamais modifiée.
+        # L'aperçu est calculé sur un proxy réduit, l'export sur l'original.
+        self.adjustments = [] # Liste de (nom, paramètres), dans l'ordre ADJUSTMENT_ORDER
+        self.harmonize_stats = None # (mean, std) Lab de cette image
+        self.harmonize_target = None # (mean, std) Lab de l'image de référence
+        self.harmonize_strength = 0.0
+        self._set_source(original_cv_image)
+        if pixmap.isNull() or self.proxy_scale < 1.0:
+            self.set_display_rgb(self.render_rgb(), keep_center=False)
+
         # Variables pour la manipulation personnalisée à la souris
         self.mouse_press_pos = QPointF()
         self.mouse_press_item_scale = 1.0
         self.mouse_press_item_rotation = 0.0
         self.current_manipulation_mode = None # 'scale', 'rotate', ou None
+        self.mouse_press_pivot = QPointF() # Pivot commun du groupe sélectionné
+        self._has_dragged = False # Pour distinguer Ctrl+clic (sélection) de Ctrl+glisser (rotation)
 
         # Pour afficher un curseur différent lors du survol si on veut affiner
         # self.setCursor(Qt.CursorShape.SizeAllCursor) # Curseur de déplacement par défaut
@@ -60,6 +903,88 @@ class DraggableResizablePixmapItem(QGraphicsPixmapItem):
         self._is_active = active
         self.update()
 
+    def _set_source(self, cv_image, proxy=None, proxy_scale=None, source_id=None):
+        """
+        Définit l'image source et son proxy d'aperçu (préparé par prepare_source s'il n'est
+        pas fourni). L'original garde sa profondeur (8/16 bits ou flottant) ; le proxy est en 8 bits.
+        """
+        if proxy is None:
+            proxy, proxy_scale = prepare_source(cv_image)
+        self.original_cv_image = cv_image
+        self.proxy_cv_image = proxy
+        self.proxy_scale = proxy_scale
+        self.source_id = next(_SOURCE_IDS) if source_id is None else source_id
+
+    def replace_source(self, cv_image, proxy, proxy_scale, source_id, stats, preview_rgb):
+        """
+        Remplace l'image source (fichier modifié sur le disque) par des tampons déjà préparés
+        dans un worker, en conservant la transformation, le Z-order et la pile d'ajustements.
+        Le nouvel identifiant de source invalide le cache.
+        """
+        self._set_source(cv_image, proxy, proxy_scale, source_id)
+        if self.harmonize_stats is not None:
+            self.harmonize_stats = stats
+        self.set_display_rgb(preview_rgb)
+
+    def set_adjustments(self, adjustments):
+        """ Remplace la pile d'ajustements à partir d'un dict {nom: paramètres}. """
+        self.adjustments = [(name, dict(adjustments[name])) for name in ADJUSTMENT_ORDER if name in adjustments]
+
+    def adjustment_params(self, name):
+        for stage_name, params in self.adjustments:
+            if stage_name == name:
+                return params
+        return None
+
+    def pipeline_stages(self):
+        return build_pipeline_stages(self.harmonize_stats, self.harmonize_target,
+                                     self.harmonize_strength, self.adjustments)
+
+    def render_bgr(self, full_resolution=False):
+        """
+        Exécute le pipeline d'ajustements sur le proxy (aperçu) ou sur l'original (export).
+        Chaque étape est mémorisée dans STAGE_CACHE : modifier un paramètre ne recalcule
+        que cette étape et les suivantes.
+        Ne touche pas aux objets Qt : peut être appelée depuis un thread de travail.
+        """
+        if full_resolution:
+            image, scale = self.original_cv_image, 1.0
+        else:
+            image, scale = self.proxy_cv_image, self.proxy_scale
+        return run_pipeline(image, scale, self.source_id, self.pipeline_stages())
+
+    def render_rgb(self, full_resolution=False):
+        return cv2.cvtColor(self.render_bgr(full_resolution), cv2.COLOR_BGR2RGB)
+
+    def set_display_rgb(self, rgb_image, full_resolution=False, keep_center=True):
+        """
+        Affiche un rendu du pipeline. Le rapport de pixels du pixmap est réglé sur l'échelle
+        du proxy pour que la taille logique (et donc la géométrie sur le canevas) reste
+        celle de l'original.
+        """
+        pixmap = rgb_array_to_qpixmap(rgb_image)
+        if not full_resolution:
+            pixmap.setDevicePixelRatio(self.proxy_scale)
+        # Garder le centre de transformation au même endroit de la scène si la taille change
+        old_center = self.mapToScene(self.transformOriginPoint())
+        self.setPixmap(pixmap)
+        new_origin = self.boundingRect().center()
+        if new_origin != self.transformOriginPoint():
+            self.setTransformOriginPoint(new_origin)
+            if keep_center:
+                self.moveBy(*(old_center - self.mapToScene(new_origin)).toTuple())
+
+    def _main_window(self):
+        """Retourne la MainWindow qui possède la scène de cet item (ou None)."""
+        if not self.scene():
+            return None
+        owner = self.scene().parent()
+        if isinstance(owner, MainWindow):
+            return owner
+        if owner and hasattr(owner, 'parent') and isinstance(owner.parent(), MainWindow):
+            return owner.parent()
+        return None
+
     def set_interactive_opacity(self, enable):
         if enable:
             self.setOpacity(0.5)
@@ -80,6 +1005,13 @@ class DraggableResizablePixmapItem(QGraphicsPixmapItem):
             self.mouse_press_pos = event.scenePos() # Position de la souris dans la scène
             self.mouse_press_item_scale = self.scale()
             self.mouse_press_item_rotation = self.rotation()
+            self._has_dragged = False
+
+            main_window = self._main_window()
+            if main_window and self.isSelected():
+                self.mouse_press_pivot = main_window._selection_pivot()
+            else:
+                self.mouse_press_pivot = self.mapToScene(self.transformOriginPoint())
 
             modifiers = QApplication.keyboardModifiers() # Récupérer les modificateurs globaux
 
@@ -115,11 +1047,14 @@ class DraggableResizablePixmapItem(QGraphicsPixmapItem):
             current_mouse_pos = event.scenePos()
             delta_pos = current_mouse_pos - self.mouse_press_pos
 
-            main_window = None
-            if self.scene():
-                view_widget = self.scene().parent()
-                if view_widget and hasattr(view_widget, 'parent') and isinstance(view_widget.parent(), MainWindow):
-                    main_window = view_widget.parent()
+            if not self._has_dragged:
+                # Tant que la souris n'a pas assez bougé, on considère encore un simple clic
+                if delta_pos.manhattanLength() < QApplication.startDragDistance():
+                    event.accept()
+                    return
+                self._has_dragged = True
+
+            main_window = self._main_window()
 
             # Déterminer la sensibilité en fonction du mode précis de la MainWindow
             is_precise_mouse_mode = False
@@ -127,6 +1062,9 @@ class DraggableResizablePixmapItem(QGraphicsPixmapItem):
                 is_precise_mouse_mode = main_window.is_precise_mode
                 # print(f"[DEBUG] Mouse precise mode: {is_precise_mouse_mode}") # Pour débogage
 
+            # Si l'item fait partie d'une sélection, la manipulation s'applique à tout le groupe
+            group_mode = main_window is not None and self.isSelected()
+
             if self.current_manipulation_mode == 'scale':
                 if is_precise_mouse_mode:
                     scale_sensitivity = 0.0001 # Sensibilité précise
@@ -138,16 +1076,22 @@ class DraggableResizablePixmapItem(QGraphicsPixmapItem):
                 scale_change = -delta_pos.y() * scale_sensitivity
                 new_scale = self.mouse_press_item_scale + scale_change
                 new_scale = max(0.05, new_scale)
-                self.setScale(new_scale)
 
-                if main_window and hasattr(main_window, '_on_item_manipulated'):
-                    main_window._on_item_manipulated(self) # Mise à jour des spinbox (si souhaité en temps réel)
+                if group_mode:
+                    # Facteur incrémental par rapport à l'état courant de l'item saisi
+                    main_window.apply_group_transform(
+                        scale_factor=new_scale / self.scale(), pivot=self.mouse_press_pivot
+                    )
+                else:
+                    self.setScale(new_scale)
+                    if main_window and hasattr(main_window, '_on_item_manipulated'):
+                        main_window._on_item_manipulated(self) # Mise à jour des spinbox (si souhaité en temps réel)
 
                 event.accept()
                 return
 
             elif self.current_manipulation_mode == 'rotate':
-                center_point = self.mapToScene(self.transformOriginPoint()) # Point central de l'item dans la scène
+                center_point = self.mouse_press_pivot # Pivot (centre de l'item ou du groupe) dans la scène
 
                 # Vecteur initial depuis le centre vers la position de pression de la souris
                 vec_initial = self.mouse_press_pos - center_point
@@ -172,10 +1116,14 @@ class DraggableResizablePixmapItem(QGraphicsPixmapItem):
                 # sensitivity_factor = 0.5 # Si 1.0, rotation directe. < 1.0 pour plus lent.
                 # new_rotation = self.mouse_press_item_rotation + (delta_angle_deg * sensitivity_factor)
 
-                self.setRotation(new_rotation)
-
-                if main_window and hasattr(main_window, '_on_item_manipulated'):
-                    main_window._on_item_manipulated(self) # Mise à jour des spinbox (si souhaité en temps réel)
+                if group_mode:
+                    main_window.apply_group_transform(
+                        rotation_delta=float(new_rotation - self.rotation()), pivot=self.mouse_press_pivot
+                    )
+                else:
+                    self.setRotation(new_rotation)
+                    if main_window and hasattr(main_window, '_on_item_manipulated'):
+                        main_window._on_item_manipulated(self) # Mise à jour des spinbox (si souhaité en temps réel)
 
                 event.accept()
                 return
@@ -188,13 +1136,15 @@ class DraggableResizablePixmapItem(QGraphicsPixmapItem):
             self.current_manipulation_mode = None
             self.unsetCursor()
 
+            if mode_was == 'rotate' and not self._has_dragged:
+                # Ctrl+clic sans glisser : ajouter/retirer l'item de la sélection
+                self.setSelected(not self.isSelected())
+                print(f"[DEBUG] Item {self.filename}: Ctrl+clic, sélectionné: {self.isSelected()}")
+                event.accept()
+                return
+
             # Informer la MainWindow que la manipulation est terminée
-            main_window = None
-            if self.scene():
-                view = self.scene().parent() 
-                if view and hasattr(view, 'parent') and isinstance(view.parent(), MainWindow):
-                    main_window = view.parent()
-            
+            main_window = self._main_window()
             if main_window and hasattr(main_window, '_on_item_manipulated'):
                 print(f"[DEBUG] Item {self.filename}: mouseRelease, mode {mode_was}, notifiant MainWindow.")
                 main_window._on_item_manipulated(self) # Met à jour les spinboxes
@@ -207,14 +1157,32 @@ class DraggableResizablePixmapItem(QGraphicsPixmapItem):
 class CanvasView(QGraphicsView):
     """
     Vue personnalisée pour gérer le zoom et le dézoom.
+    Le glisser sur le fond trace un rectangle de sélection ; maintenir Espace
+    permet de "tirer" la scène.
     """
     def __init__(self, scene, parent=None):
         super().__init__(scene, parent)
         self.setRenderHint(QPainter.RenderHint.Antialiasing)
         self.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
-        self.setDragMode(QGraphicsView.DragMode.ScrollHandDrag) # Permet de "tirer" la scène
+        self.setDragMode(QGraphicsView.DragMode.RubberBandDrag) # Sélection multiple au rectangle
+        self.setRubberBandSelectionMode(Qt.ItemSelectionMode.IntersectsItemShape)
         self.zoom_factor_base = 1.1
 
+    def keyPressEvent(self, event):
+        # Espace maintenu : déplacement de la scène à la main
+        if event.key() == Qt.Key.Key_Space and not event.isAutoRepeat():
+            self.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
+            event.accept()
+            return
+        super().keyPressEvent(event)
+
+    def keyReleaseEvent(self, event):
+        if event.key() == Qt.Key.Key_Space and not event.isAutoRepeat():
+            self.setDragMode(QGraphicsView.DragMode.RubberBandDrag)
+            event.accept()
+            return
+        super().keyReleaseEvent(event)
+
     def wheelEvent(self, event):
         # Zoom avec la molette de la souris
         if event.modifiers() == Qt.KeyboardModifier.ControlModifier:
@@ -239,7 +1207,88 @@ class CanvasView(QGraphicsView):
         self.resetTransform()
 
 
+class VideoFrameExtractor(QThread):
+    """
+    Thread d'extraction des images vidéo. Chaque image retenue est envoyée au thread GUI
+    par frameExtracted dès qu'elle est décodée.
+    """
+    frameExtracted = Signal(object, str) # (image BGR, nom du calque)
+    extractionFailed = Signal(str)
+
+    def __init__(self, video_files, options, max_frames, parent=None):
+        super().__init__(parent)
+        self.video_files = list(video_files)
+        self.options = dict(options)
+        self.max_frames = max_frames
+
+    def run(self):
+        remaining = self.max_frames
+        for path in self.video_files:
+            if remaining <= 0 or self.isInterruptionRequested():
+                break
+            name = os.path.basename(path)
+            try:
+                for frame, seconds in iter_video_frames(path, max_frames=remaining,
+                                                        should_stop=self.isInterruptionRequested,
+                                                        **self.options):
+                    self.frameExtracted.emit(frame, f"{name} @ {seconds:.2f}s")
+                    remaining -= 1
+            except Exception as e:
+                self.extractionFailed.emit(f"Erreur extraction {name}: {e}")
+
+
+class VideoFramePickerDialog(QDialog):
+    """ Choix des images à extraire des vidéos importées. """
+    def __init__(self, max_frames, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Images à extraire des vidéos")
+        layout = QFormLayout(self)
+
+        self.mode_combo = QComboBox()
+        for mode, label in FRAME_PICK_MODES:
+            self.mode_combo.addItem(label, mode)
+        layout.addRow("Mode:", self.mode_combo)
+
+        self.step_spinbox = QSpinBox()
+        self.step_spinbox.setRange(1, 100000)
+        self.step_spinbox.setValue(30)
+        layout.addRow("N (toutes les N images):", self.step_spinbox)
+
+        self.threshold_spinbox = QDoubleSpinBox()
+        self.threshold_spinbox.setRange(0.05, 1.0)
+        self.threshold_spinbox.setSingleStep(0.05)
+        self.threshold_spinbox.setValue(0.5)
+        layout.addRow("Seuil de changement de plan:", self.threshold_spinbox)
+
+        self.timestamps_edit = QLineEdit()
+        self.timestamps_edit.setPlaceholderText("ex: 1.5, 12, 30.25")
+        layout.addRow("Instants (secondes):", self.timestamps_edit)
+
+        layout.addRow(QLabel(f"{max_frames} image(s) au maximum seront conservées."))
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def options(self):
+        timestamps = []
+        for part in self.timestamps_edit.text().replace(';', ',').split(','):
+            try:
+                timestamps.append(float(part))
+            except ValueError:
+                pass # Ignorer les entrées invalides
+        return {
+            'mode': self.mode_combo.currentData(),
+            'step': self.step_spinbox.value(),
+            'threshold': self.threshold_spinbox.value(),
+            'timestamps': tuple(timestamps),
+        }
+
+
 class MainWindow(QMainWindow):
+    sourceReloaded = Signal(str, int, object) # (chemin, génération, image décodée ou None), émis depuis un worker
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Application de Composition d'Images")
@@ -248,6 +1297,15 @@ class MainWindow(QMainWindow):
         self.image_items = [] # Liste pour stocker les DraggableResizablePixmapItem
         self.active_item = None
         self.is_precise_mode = False
+        # Pool de threads pour les traitements d'images par calque (OpenCV libère le GIL)
+        self.worker_pool = ThreadPoolExecutor(max_workers=MAX_IMAGES)
+        self.video_extractor = None # Thread d'extraction d'images vidéo en cours (ou None)
+        # Surveillance des fichiers sources (rechargement à chaud)
+        self.file_watcher = QFileSystemWatcher(self)
+        self._reload_timers = {} # chemin -> QTimer d'anti-rebond
+        self._reload_generations = {} # chemin -> numéro du dernier rechargement demandé
+        self._missing_sources = set() # Fichiers surveillés disparus : attendus via leur répertoire parent
+        self.harmonize_reference = None # Calque de référence de la dernière harmonisation
 
         self._setup_ui()
         self._create_actions()
@@ -314,6 +1372,68 @@ class MainWindow(QMainWindow):
         self.scale_spinbox.setValue(1.0)
         controls_layout.addRow("Échelle:", self.scale_spinbox)
 
+        self.harmonize_slider = QSlider(Qt.Orientation.Horizontal)
+        self.harmonize_slider.setRange(0, 100)
+        self.harmonize_slider.setValue(0)
+        self.harmonize_slider.setEnabled(False) # Activé après "Harmoniser les couleurs"
+        controls_layout.addRow("Harmonisation:", self.harmonize_slider)
+
+        # Ajustements non destructifs de l'image active
+        adjustments_group = QGroupBox("Ajustements")
+        adjustments_layout = QFormLayout(adjustments_group)
+        self.adjustment_spinboxes = {}
+
+        def make_spinbox(key, minimum, maximum, step, decimals, value, suffix=""):
+            spinbox = QDoubleSpinBox()
+            spinbox.setRange(minimum, maximum)
+            spinbox.setSingleStep(step)
+            spinbox.setDecimals(decimals)
+            spinbox.setValue(value)
+            if suffix:
+                spinbox.setSuffix(suffix)
+            self.adjustment_spinboxes[key] = spinbox
+            return spinbox
+
+        crop_layout = QHBoxLayout()
+        for side in ('left', 'top', 'right', 'bottom'):
+            crop_layout.addWidget(make_spinbox('crop_' + side, 0, 49, 1, 0, 0, " %"))
+        adjustments_layout.addRow("Recadrage (G/H/D/B):", crop_layout)
+        adjustments_layout.addRow("Redimensionner:", make_spinbox('resize', 0.05, 4.0, 0.05, 2, 1.0, " ×"))
+        adjustments_layout.addRow("Luminosité:", make_spinbox('brightness', -100, 100, 5, 0, 0))
+        adjustments_layout.addRow("Contraste:", make_spinbox('contrast', 0.1, 3.0, 0.05, 2, 1.0))
+        adjustments_layout.addRow("Flou:", make_spinbox('blur', 0, 50, 0.5, 1, 0, " px"))
+        adjustments_layout.addRow("Netteté:", make_spinbox('sharpen', 0, 5, 0.1, 1, 0))
+        controls_layout.addRow(adjustments_group)
+
+        # Disposition automatique des calques (collage)
+        layout_group = QGroupBox("Disposition automatique")
+        layout_form = QFormLayout(layout_group)
+        self.layout_mode_combo = QComboBox()
+        for mode, label in LAYOUT_MODES:
+            self.layout_mode_combo.addItem(label, mode)
+        layout_form.addRow("Mode:", self.layout_mode_combo)
+        self.layout_aspect_spinbox = QDoubleSpinBox()
+        self.layout_aspect_spinbox.setRange(0.1, 10.0)
+        self.layout_aspect_spinbox.setSingleStep(0.1)
+        self.layout_aspect_spinbox.setDecimals(2)
+        self.layout_aspect_spinbox.setValue(1.5)
+        layout_form.addRow("Ratio du canevas:", self.layout_aspect_spinbox)
+        self.layout_spacing_spinbox = QDoubleSpinBox()
+        self.layout_spacing_spinbox.setRange(0, 1000)
+        self.layout_spacing_spinbox.setDecimals(0)
+        self.layout_spacing_spinbox.setValue(10)
+        self.layout_spacing_spinbox.setSuffix(" px")
+        layout_form.addRow("Espacement:", self.layout_spacing_spinbox)
+        self.layout_uniform_checkbox = QCheckBox("Échelle uniforme")
+        self.layout_uniform_checkbox.setChecked(True)
+        layout_form.addRow(self.layout_uniform_checkbox)
+        self.layout_on_import_checkbox = QCheckBox("Appliquer à l'import")
+        self.layout_on_import_checkbox.setChecked(True)
+        layout_form.addRow(self.layout_on_import_checkbox)
+        self.layout_button = QPushButton("Disposer")
+        layout_form.addRow(self.layout_button)
+        controls_layout.addRow(layout_group)
+
         self.controls_dock.setWidget(controls_widget)
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.controls_dock)
 
@@ -333,6 +1453,25 @@ class MainWindow(QMainWindow):
                                      shortcut=QKeySequence.StandardKey.Save,
                                      statusTip="Exporter l'image composite",
                                      triggered=self.export_composition)
+        self.harmonize_action = QAction("&Harmoniser les couleurs", self,
+                                        shortcut="Ctrl+H",
+                                        statusTip="Harmoniser couleur et exposition sur l'image active",
+                                        triggered=self.harmonize_colors)
+        self.auto_layout_action = QAction("&Disposition automatique", self,
+                                          shortcut="Ctrl+L",
+                                          statusTip="Disposer automatiquement les images sur le canevas",
+                                          triggered=self.auto_layout)
+        self.export_layers_action = QAction("Exporter en &calques (OpenRaster)...", self,
+                                            shortcut="Ctrl+Shift+S",
+                                            statusTip="Exporter chaque image comme un calque positionné (.ora)",
+                                            triggered=self.export_layers)
+        self.high_depth_action = QAction("Conserver la &profondeur des sources (16 bits / flottant)", self,
+                                         checkable=True,
+                                         statusTip="Importer sans conversion en 8 bits ; l'aperçu reste en 8 bits")
+        self.watch_action = QAction("&Surveiller les fichiers sources", self,
+                                    checkable=True,
+                                    statusTip="Recharger automatiquement les images modifiées dans un autre programme",
+                                    toggled=self._on_watch_toggled)
         self.quit_action = QAction("&Quitter", self,
                                    shortcut=QKeySequence.StandardKey.Quit,
                                    statusTip="Quitter l'application",
@@ -352,6 +1491,12 @@ class MainWindow(QMainWindow):
         file_toolbar = self.addToolBar("Fichier")
         file_toolbar.addAction(self.import_action)
         file_toolbar.addAction(self.export_action)
+        file_toolbar.addAction(self.export_layers_action)
+
+        # Barre d'outils Image
+        image_toolbar = self.addToolBar("Image")
+        image_toolbar.addAction(self.harmonize_action)
+        image_toolbar.addAction(self.auto_layout_action)
 
         # Barre d'outils Vue
         view_toolbar = self.addToolBar("Vue")
@@ -364,9 +1509,17 @@ class MainWindow(QMainWindow):
         file_menu = self.menuBar().addMenu("&Fichier")
         file_menu.addAction(self.import_action)
         file_menu.addAction(self.export_action)
+        file_menu.addAction(self.export_layers_action)
+        file_menu.addAction(self.high_depth_action)
+        file_menu.addAction(self.watch_action)
         file_menu.addSeparator()
         file_menu.addAction(self.quit_action)
 
+        # Menu Image
+        image_menu = self.menuBar().addMenu("&Image")
+        image_menu.addAction(self.harmonize_action)
+        image_menu.addAction(self.auto_layout_action)
+
         # Menu Vue
         view_menu = self.menuBar().addMenu("&Vue")
         view_menu.addAction(self.zoom_in_action)
@@ -375,29 +1528,90 @@ class MainWindow(QMainWindow):
 
     def _on_scene_selection_changed(self):
         print("[DEBUG] _on_scene_selection_changed: Signal reçu.")
-        selected_items = self.scene.selectedItems()
+        selected_items = self._selected_image_items()
         if selected_items:
-            # Prendre le premier item sélectionné (normalement un seul avec ItemIsSelectable)
-            # S'assurer que c'est bien un de nos items d'image
-            active_candidate = selected_items[0]
-            if isinstance(active_candidate, DraggableResizablePixmapItem):
+            # Garder l'item actif s'il fait toujours partie de la sélection,
+            # sinon prendre le premier item sélectionné comme nouvel item actif.
+            if self.active_item not in selected_items:
+                active_candidate = selected_items[0]
                 print(f"[DEBUG] _on_scene_selection_changed: Item sélectionné: {active_candidate.filename}")
-                if self.active_item != active_candidate: # Si c'est un nouvel item
-                    self._set_active_item(active_candidate)
-                    # Mettre à jour la sélection dans la liste des miniatures
-                    for i in range(self.thumbnail_list_widget.count()):
-                        list_item = self.thumbnail_list_widget.item(i)
-                        if list_item.data(Qt.ItemDataRole.UserRole) == active_candidate:
-                            self.thumbnail_list_widget.setCurrentItem(list_item, QItemSelectionModel.SelectionFlag.ClearAndSelect) # S'assurer qu'il est bien sélectionné
-                            print(f"[DEBUG] _on_scene_selection_changed: Miniature {i} sélectionnée pour {active_candidate.filename}")
-                            break
-            else:
-                print(f"[DEBUG] _on_scene_selection_changed: Item sélectionné n'est pas un DraggableResizablePixmapItem: {type(active_candidate)}")
+                self._set_active_item(active_candidate)
+                # Mettre à jour la sélection dans la liste des miniatures
+                for i in range(self.thumbnail_list_widget.count()):
+                    list_item = self.thumbnail_list_widget.item(i)
+                    if list_item.data(Qt.ItemDataRole.UserRole) == active_candidate:
+                        self.thumbnail_list_widget.setCurrentItem(list_item, QItemSelectionModel.SelectionFlag.ClearAndSelect) # S'assurer qu'il est bien sélectionné
+                        print(f"[DEBUG] _on_scene_selection_changed: Miniature {i} sélectionnée pour {active_candidate.filename}")
+                        break
+            print(f"[DEBUG] _on_scene_selection_changed: {len(selected_items)} item(s) sélectionné(s).")
         else:
             print("[DEBUG] _on_scene_selection_changed: Aucun item sélectionné. Désactivation de l'item actif.")
             self._set_active_item(None)
+        self._update_active_label()
         self.update_controls_state() # Mettre à jour les contrôles dans tous les cas
 
+    def _selected_image_items(self):
+        """ Retourne les DraggableResizablePixmapItem sélectionnés, dans l'ordre de self.image_items. """
+        return [item for item in self.image_items if item.isSelected()]
+
+    def _selection_pivot(self):
+        """
+        Pivot commun du groupe : barycentre des centres de transformation des images
+        sélectionnées, en coordonnées scène. Contrairement au centre du rectangle englobant,
+        il reste fixe lors d'une rotation ou d'une mise à l'échelle autour de lui, donc
+        des pas successifs (R puis E, + puis -) s'annulent exactement.
+        """
+        selected_items = self._selected_image_items()
+        if not selected_items:
+            return QPointF()
+        sum_x = sum_y = 0.0
+        for item in selected_items:
+            center = item.mapToScene(item.transformOriginPoint())
+            sum_x += center.x()
+            sum_y += center.y()
+        return QPointF(sum_x / len(selected_items), sum_y / len(selected_items))
+
+    def apply_group_transform(self, dx=0.0, dy=0.0, rotation_delta=0.0, scale_factor=1.0, pivot=None):
+        """
+        Applique un déplacement, une rotation et/ou un changement d'échelle à toutes
+        les images sélectionnées, autour d'un pivot commun (centre de la sélection par défaut).
+        Les mises à jour sont regroupées : une seule invalidation de la vue et un seul
+        rafraîchissement des contrôles par pas, quel que soit le nombre d'items.
+        """
+        items = self._selected_image_items()
+        if not items:
+            return
+        if pivot is None:
+            pivot = self._selection_pivot()
+
+        cos_a = math.cos(math.radians(rotation_delta))
+        sin_a = math.sin(math.radians(rotation_delta))
+
+        viewport = self.view.viewport()
+        viewport.setUpdatesEnabled(False)
+        try:
+            for item in items:
+                # Centre de transformation de l'item dans la scène (= pos + transformOriginPoint)
+                center = item.mapToScene(item.transformOriginPoint())
+                if rotation_delta or scale_factor != 1.0:
+                    # Nouvelle position du centre : rotation + homothétie autour du pivot
+                    vx = (center.x() - pivot.x()) * scale_factor
+                    vy = (center.y() - pivot.y()) * scale_factor
+                    new_center = QPointF(pivot.x() + vx * cos_a - vy * sin_a,
+                                         pivot.y() + vx * sin_a + vy * cos_a)
+                    if rotation_delta:
+                        # Garder la rotation dans la plage du spinbox (-360, 360)
+                        item.setRotation(math.fmod(item.rotation() + rotation_delta, 360))
+                    if scale_factor != 1.0:
+                        item.setScale(max(0.01, item.scale() * scale_factor))
+                    item.moveBy(new_center.x() - center.x() + dx, new_center.y() - center.y() + dy)
+                elif dx or dy:
+                    item.moveBy(dx, dy)
+        finally:
+            viewport.setUpdatesEnabled(True)
+        viewport.update() # Une seule invalidation pour tout le groupe
+        self.update_controls_state()
+
     def _connect_signals(self):
         self.thumbnail_list_widget.itemClicked.connect(self._on_thumbnail_clicked)
         # Connecter au signal rowsMoved du modèle du QListWidget
@@ -406,6 +1620,13 @@ class MainWindow(QMainWindow):
         self.precise_mode_checkbox.stateChanged.connect(self._on_precise_mode_changed)
         self.rotation_spinbox.valueChanged.connect(self._on_rotation_changed)
         self.scale_spinbox.valueChanged.connect(self._on_scale_changed)
+        self.harmonize_slider.valueChanged.connect(self._on_harmonize_strength_changed)
+        for spinbox in self.adjustment_spinboxes.values():
+            spinbox.valueChanged.connect(self._on_adjustment_changed)
+        self.layout_button.clicked.connect(self.auto_layout)
+        self.file_watcher.fileChanged.connect(self._on_source_file_changed)
+        self.file_watcher.directoryChanged.connect(self._on_source_directory_changed)
+        self.sourceReloaded.connect(self._on_source_reloaded)
         self.scene.selectionChanged.connect(self._on_scene_selection_changed)
 
     # Dans MainWindow
@@ -479,6 +1700,8 @@ class MainWindow(QMainWindow):
         is_item_active = self.active_item is not None
         self.rotation_spinbox.setEnabled(is_item_active)
         self.scale_spinbox.setEnabled(is_item_active)
+        for spinbox in self.adjustment_spinboxes.values():
+            spinbox.setEnabled(is_item_active)
 
         if is_item_active:
             # Bloquer les signaux pour éviter les mises à jour en boucle
@@ -498,7 +1721,12 @@ class MainWindow(QMainWindow):
         print("[DEBUG] import_images: Fonction appelée.")
 
         file_dialog = QFileDialog(self)
-        file_dialog.setNameFilter("Images (*.png *.jpg *.jpeg *.bmp)")
+        video_patterns = " ".join("*" + ext for ext in VIDEO_EXTENSIONS)
+        file_dialog.setNameFilters([
+            f"Images et vidéos (*.png *.jpg *.jpeg *.bmp *.tif *.tiff {video_patterns})",
+            "Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff)",
+            f"Vidéos ({video_patterns})",
+        ])
         # Permettre la sélection multiple
         file_dialog.setFileMode(QFileDialog.FileMode.ExistingFiles)
 
@@ -511,26 +1739,45 @@ class MainWindow(QMainWindow):
                 self.status_bar.showMessage("Aucun fichier n'a été sélectionné.", 3000)
                 return
 
-            if not (MIN_IMAGES <= len(filenames) <= MAX_IMAGES):
+            video_files = [f for f in filenames if is_video_file(f)]
+            image_files = [f for f in filenames if not is_video_file(f)]
+
+            # Avec des vidéos, le nombre de calques dépend des images extraites :
+            # seule la limite haute s'applique aux images fixes.
+            if video_files:
+                if len(image_files) >= MAX_IMAGES:
+                    self.status_bar.showMessage(
+                        f"Trop d'images : {MAX_IMAGES} calques au maximum, vidéos comprises.", 5000
+                    )
+                    return
+            elif not (MIN_IMAGES <= len(filenames) <= MAX_IMAGES):
                 print(f"[DEBUG] import_images: Nombre de fichiers ({len(filenames)}) hors des limites ({MIN_IMAGES}-{MAX_IMAGES}).")
                 self.status_bar.showMessage(
                     f"Veuillez sélectionner entre {MIN_IMAGES} et {MAX_IMAGES} images.", 5000
                 )
                 return
 
+            frame_options = None
+            if video_files:
+                picker = VideoFramePickerDialog(MAX_IMAGES - len(image_files), self)
+                if not picker.exec():
+                    print("[DEBUG] import_images: Sélection des images vidéo annulée.")
+                    return
+                frame_options = picker.options()
+
             # Effacer les images précédentes SEULEMENT si de nouvelles images valides sont sélectionnées
             self.clear_all_images()
             print("[DEBUG] import_images: Anciennes images effacées (appel de clear_all_images).")
 
-            successful_imports = 0
-            for i, filename in enumerate(filenames):
-                print(f"[DEBUG] import_images: Traitement de l'image {i+1}/{len(filenames)}: {filename}")
+            for i, filename in enumerate(image_files):
+                print(f"[DEBUG] import_images: Traitement de l'image {i+1}/{len(image_files)}: {filename}")
                 try:
                     # Essayer de lire avec une méthode plus robuste pour les chemins sous Windows
                     # np_array_img = np.fromfile(filename, np.uint8)
                     # cv_image = cv2.imdecode(np_array_img, cv2.IMREAD_COLOR)
                     # Ou la méthode standard:
-                    cv_image = cv2.imread(filename)
+                    # Avec l'option haute profondeur, garder la profondeur d'origine ; l'aperçu sera converti en 8 bits
+                    cv_image = read_source_image(filename, keep_depth=self.high_depth_action.isChecked())
 
                     if cv_image is None:
                         print(f"[ERREUR] import_images: cv2.imread (ou imdecode) a retourné None pour {filename}. Vérifiez le chemin et le fichier.")
@@ -544,58 +1791,7 @@ class MainWindow(QMainWindow):
                         raise IOError(f"Impossible de charger l'image {filename} avec OpenCV. L'image est peut-être corrompue ou le format n'est pas supporté.")
 
                     print(f"[DEBUG] import_images: Image {filename} chargée par OpenCV. Dimensions: {cv_image.shape}")
-
-                    # Convertir BGR (OpenCV) en RGB (Qt)
-                    # S'assurer que l'image a 3 canaux (BGR) avant de convertir en RGB
-                    if len(cv_image.shape) == 2: # Image en niveaux de gris
-                        print(f"[INFO] import_images: Image {filename} est en niveaux de gris. Conversion en BGR.")
-                        cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
-                    elif cv_image.shape[2] == 4: # Image BGRA
-                        print(f"[INFO] import_images: Image {filename} a un canal alpha (BGRA). Conversion en BGR.")
-                        cv_image = cv2.cvtColor(cv_image, cv2.COLOR_BGRA2BGR)
-                    
-                    # Maintenant, cv_image devrait être BGR
-                    rgb_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB)
-                    h, w, ch = rgb_image.shape
-                    bytes_per_line = ch * w
-                    
-                    # Il est crucial que les données de rgb_image.data restent valides.
-                    # QImage peut ne pas copier les données immédiatement.
-                    # Pour être sûr, on peut faire une copie des données pour QImage.
-                    # Mais QPixmap.fromImage() fait généralement une copie profonde.
-                    q_image_data_copy = rgb_image.copy() # Garde les données en vie
-                    q_image = QImage(q_image_data_copy.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-                    
-                    if q_image.isNull():
-                        print(f"[ERREUR] import_images: QImage est nulle pour {filename} après conversion.")
-                        raise ValueError("La QImage créée est nulle.")
-                    pixmap = QPixmap.fromImage(q_image)
-                    if pixmap.isNull():
-                        print(f"[ERREUR] import_images: QPixmap est nulle pour {filename} après QPixmap.fromImage.")
-                        raise ValueError("La QPixmap créée est nulle.")
-
-                    print(f"[DEBUG] import_images: Pixmap créé pour {filename}. Taille: {pixmap.size()}. Est nul: {pixmap.isNull()}")
-
-                    # Créer l'item graphique
-                    item = DraggableResizablePixmapItem(pixmap, os.path.basename(filename), cv_image) # cv_image est l'original (potentiellement modifié GRAY->BGR)
-                    self.image_items.append(item)
-                    self.scene.addItem(item) # Ajout à la scène graphique
-                    print(f"[DEBUG] import_images: Item graphique ajouté à la scène pour {filename}. Nombre d'items dans la scène: {len(self.scene.items())}")
-
-                    # Positionner initialement en cascade
-                    item.setPos(i * 20, i * 20)
-                    print(f"[DEBUG] import_images: Item positionné à ({i*20}, {i*20}). BoundingRect de l'item: {item.boundingRect()}")
-
-                    # Créer la miniature
-                    thumbnail_pixmap = pixmap.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE,
-                                                     Qt.AspectRatioMode.KeepAspectRatio,
-                                                     Qt.TransformationMode.SmoothTransformation)
-                    print(f"[DEBUG] import_images: Thumbnail pixmap créé. Taille: {thumbnail_pixmap.size()}, Est nul: {thumbnail_pixmap.isNull()}")
-                    list_item = QListWidgetItem(QIcon(thumbnail_pixmap), os.path.basename(filename))
-                    list_item.setData(Qt.ItemDataRole.UserRole, item)
-                    self.thumbnail_list_widget.addItem(list_item) # Ajout à la liste des miniatures
-                    print(f"[DEBUG] import_images: Miniature ajoutée à la liste pour {filename}. Nombre d'items dans la liste: {self.thumbnail_list_widget.count()}")
-                    successful_imports += 1
+                    self._add_image_layer(cv_image, os.path.basename(filename), source_path=filename)
 
                 except Exception as e:
                     self.status_bar.showMessage(f"Erreur importation {filename}: {e}", 7000)
@@ -603,21 +1799,11 @@ class MainWindow(QMainWindow):
                     import traceback
                     traceback.print_exc() # Imprime la trace complète de l'exception
 
-            if successful_imports > 0:
-                print(f"[DEBUG] import_images: {successful_imports} image(s) importée(s) avec succès. Sélection de la première.")
-                self._set_active_item(self.image_items[0]) # image_items[0] est le premier Draggable...
-                self.thumbnail_list_widget.setCurrentRow(0)
-                self.update_z_order_from_thumbnails() # << AJOUTER CET APPEL ICI
+            if video_files:
+                # L'extraction se fait hors du thread GUI ; l'import se termine à la fin du thread
+                self._start_video_extraction(video_files, frame_options, MAX_IMAGES - len(self.image_items))
             else:
-                print("[DEBUG] import_images: Aucune image n'a été importée avec succès.")
-
-            # Ajuster la vue à la scène après que tous les items y ont été ajoutés et positionnés
-            current_scene_rect = self.scene.itemsBoundingRect()
-            self.view.setSceneRect(current_scene_rect)
-            print(f"[DEBUG] import_images: SceneRect mis à jour: {current_scene_rect}. La vue devrait se recadrer.")
-            print(f"[DEBUG] import_images: Nombre total d'items dans la scène à la fin: {len(self.scene.items())}")
-            # Forcer une mise à jour de la vue si nécessaire
-            self.view.viewport().update()
+                self._finish_import()
         else:
             print("[DEBUG] import_images: Dialogue d'importation annulé ou fermé.")
             print(f"[DEBUG] import_images (fin): thumbnail_dock visible: {self.thumbnail_dock.isVisible()}")
@@ -629,8 +1815,117 @@ class MainWindow(QMainWindow):
             self.thumbnail_list_widget.updateGeometry()
             # self.thumbnail_list_widget.adjustSize() # Peut aider
 
+    def _add_image_layer(self, cv_image, display_name, source_path=None):
+        """ Crée le calque (item graphique + miniature) pour une image OpenCV décodée. """
+        # Convertir BGR (OpenCV) en RGB (Qt)
+        # S'assurer que l'image a 3 canaux (BGR) avant de convertir en RGB
+        if len(cv_image.shape) == 2: # Image en niveaux de gris
+            print(f"[INFO] _add_image_layer: Image {display_name} est en niveaux de gris. Conversion en BGR.")
+            cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
+        elif cv_image.shape[2] == 4: # Image BGRA
+            print(f"[INFO] _add_image_layer: Image {display_name} a un canal alpha (BGRA). Conversion en BGR.")
+            cv_image = cv2.cvtColor(cv_image, cv2.COLOR_BGRA2BGR)
+
+        # Maintenant, cv_image devrait être BGR (8 bits, 16 bits ou flottant)
+        cv_image = normalize_source_depth(cv_image)
+
+        # Créer l'item graphique. L'item construit lui-même son aperçu 8 bits à partir
+        # du proxy : pas de pixmap pleine résolution ni de copie de l'original.
+        i = len(self.image_items)
+        item = DraggableResizablePixmapItem(QPixmap(), display_name, cv_image, source_path) # cv_image est l'original (potentiellement modifié GRAY->BGR)
+        pixmap = item.pixmap()
+        if pixmap.isNull():
+            print(f"[ERREUR] _add_image_layer: QPixmap est nulle pour {display_name}.")
+            raise ValueError("La QPixmap créée est nulle.")
+        print(f"[DEBUG] _add_image_layer: Pixmap créé pour {display_name}. Taille: {pixmap.size()}, profondeur source: {cv_image.dtype}")
+
+        self.image_items.append(item)
+        self.scene.addItem(item) # Ajout à la scène graphique
+        print(f"[DEBUG] _add_image_layer: Item graphique ajouté à la scène pour {display_name}. Nombre d'items dans la scène: {len(self.scene.items())}")
+
+        # Positionner initialement en cascade
+        item.setPos(i * 20, i * 20)
+        print(f"[DEBUG] _add_image_layer: Item positionné à ({i*20}, {i*20}). BoundingRect de l'item: {item.boundingRect()}")
+
+        # Créer la miniature
+        thumbnail_pixmap = pixmap.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+                                         Qt.AspectRatioMode.KeepAspectRatio,
+                                         Qt.TransformationMode.SmoothTransformation)
+        thumbnail_pixmap.setDevicePixelRatio(1.0)
+        print(f"[DEBUG] _add_image_layer: Thumbnail pixmap créé. Taille: {thumbnail_pixmap.size()}, Est nul: {thumbnail_pixmap.isNull()}")
+        list_item = QListWidgetItem(QIcon(thumbnail_pixmap), display_name)
+        list_item.setData(Qt.ItemDataRole.UserRole, item)
+        self.thumbnail_list_widget.addItem(list_item) # Ajout à la liste des miniatures
+        print(f"[DEBUG] _add_image_layer: Miniature ajoutée à la liste pour {display_name}. Nombre d'items dans la liste: {self.thumbnail_list_widget.count()}")
+        if self.watch_action.isChecked():
+            self._watch_item_source(item)
+        return item
+
+    def _finish_import(self):
+        """ Disposition, sélection et Z-order une fois tous les calques de l'import créés. """
+        successful_imports = len(self.image_items)
+        if successful_imports > 0 and self.layout_on_import_checkbox.isChecked():
+            self.auto_layout()
+
+        if successful_imports > 0:
+            print(f"[DEBUG] _finish_import: {successful_imports} image(s) importée(s) avec succès. Sélection de la première.")
+            self._set_active_item(self.image_items[0]) # image_items[0] est le premier Draggable...
+            self.thumbnail_list_widget.setCurrentRow(0)
+            self.update_z_order_from_thumbnails() # << AJOUTER CET APPEL ICI
+        else:
+            print("[DEBUG] _finish_import: Aucune image n'a été importée avec succès.")
+
+        # Ajuster la vue à la scène après que tous les items y ont été ajoutés et positionnés
+        current_scene_rect = self.scene.itemsBoundingRect()
+        self.view.setSceneRect(current_scene_rect)
+        print(f"[DEBUG] _finish_import: SceneRect mis à jour: {current_scene_rect}. La vue devrait se recadrer.")
+        print(f"[DEBUG] _finish_import: Nombre total d'items dans la scène à la fin: {len(self.scene.items())}")
+        # Forcer une mise à jour de la vue si nécessaire
+        self.view.viewport().update()
+
+    def _start_video_extraction(self, video_files, frame_options, max_frames):
+        self._stop_video_extraction()
+        self.video_extractor = VideoFrameExtractor(video_files, frame_options, max_frames, self)
+        self.video_extractor.frameExtracted.connect(self._on_video_frame_extracted)
+        self.video_extractor.extractionFailed.connect(self._on_video_extraction_failed)
+        self.video_extractor.finished.connect(self._on_video_extraction_finished)
+        self.video_extractor.finished.connect(self.video_extractor.deleteLater)
+        self.import_action.setEnabled(False)
+        self.status_bar.showMessage("Extraction des images vidéo en cours...")
+        self.video_extractor.start()
+
+    def _stop_video_extraction(self):
+        if self.video_extractor is not None:
+            self.video_extractor.requestInterruption()
+            self.video_extractor.wait()
+            self.video_extractor = None
+
+    def _on_video_frame_extracted(self, frame, display_name):
+        if self.sender() is not self.video_extractor:
+            return # Image arrivée d'une extraction interrompue
+        try:
+            self._add_image_layer(frame, display_name)
+            self.status_bar.showMessage(f"Image extraite: {display_name}", 2000)
+        except Exception as e:
+            print(f"[ERREUR] _on_video_frame_extracted: {display_name}: {e}")
+
+    def _on_video_extraction_failed(self, message):
+        self.status_bar.showMessage(message, 7000)
+        print(f"[ERREUR] Extraction vidéo: {message}")
+
+    def _on_video_extraction_finished(self):
+        print("[DEBUG] _on_video_extraction_finished: Extraction terminée.")
+        if self.sender() is not self.video_extractor:
+            return # Thread interrompu et remplacé
+        self.video_extractor = None
+        self.import_action.setEnabled(True)
+        self._finish_import()
+
     def clear_all_images(self):
         print("[DEBUG] clear_all_images: Fonction appelée.")
+        self._stop_video_extraction()
+        self.import_action.setEnabled(True)
+        self._unwatch_all_sources()
         if self.active_item:
             self.active_item.setSelected(False)
             self._set_active_item(None)
@@ -644,6 +1939,12 @@ class MainWindow(QMainWindow):
 
         self.image_items.clear()
         print("[DEBUG] clear_all_images: self.image_items vidé.")
+        STAGE_CACHE.clear() # Libérer les résultats intermédiaires des anciennes images
+        self.harmonize_reference = None
+        self.harmonize_slider.blockSignals(True)
+        self.harmonize_slider.setValue(0)
+        self.harmonize_slider.blockSignals(False)
+        self.harmonize_slider.setEnabled(False)
         self.thumbnail_list_widget.clear()
         print("[DEBUG] clear_all_images: thumbnail_list_widget vidé.")
         # self.scene.clearSelection() # Au cas où
@@ -653,11 +1954,13 @@ class MainWindow(QMainWindow):
         graphic_item = list_item.data(Qt.ItemDataRole.UserRole)
         if graphic_item and isinstance(graphic_item, DraggableResizablePixmapItem):
             print(f"[DEBUG] _on_thumbnail_clicked: Miniature cliquée pour {graphic_item.filename}")
-            # Déselectionner tous les autres items dans la scène avant de sélectionner le nouveau
-            # pour s'assurer que selectionChanged est bien émis si l'item était déjà le seul sélectionné.
-            # Ou plus simple, juste s'assurer que cet item est sélectionné.
-            # self.scene.clearSelection() # Optionnel, peut être un peu agressif
-            graphic_item.setSelected(True) # Ceci devrait déclencher scene.selectionChanged
+            # Ctrl+clic sur une miniature ajoute l'image à la sélection,
+            # un clic simple la sélectionne seule.
+            if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ControlModifier:
+                graphic_item.setSelected(True)
+            else:
+                self.scene.clearSelection()
+                graphic_item.setSelected(True) # Ceci devrait déclencher scene.selectionChanged
             # _set_active_item sera appelé par _on_scene_selection_changed
             print(f"[DEBUG] _on_thumbnail_clicked: Item {graphic_item.filename} marqué comme sélectionné dans la scène.")
         else:
@@ -667,13 +1970,13 @@ class MainWindow(QMainWindow):
     def _set_active_item(self, new_item):
         print(f"[DEBUG] _set_active_item: Tentative de définir actif: {new_item.filename if new_item else 'None'}")
 
-        # Rétablir l'opacité de l'ancien item actif s'il existe et est valide
+        # Rétablir l'opacité de l'ancien item actif s'il existe et est valide.
+        # Il reste sélectionné : plusieurs images peuvent faire partie de la sélection.
         if self.active_item and self.active_item != new_item:
             if isinstance(self.active_item, DraggableResizablePixmapItem):
                 self.active_item.set_active(False)
-                self.active_item.setSelected(False)
                 self.active_item.set_interactive_opacity(False) # Rétablir l'opacité
-                print(f"[DEBUG] _set_active_item: Ancien item {self.active_item.filename} désactivé, désélectionné, opacité rétablie.")
+                print(f"[DEBUG] _set_active_item: Ancien item {self.active_item.filename} désactivé, opacité rétablie.")
 
         old_active_item_ref = self.active_item
         self.active_item = new_item
@@ -691,10 +1994,11 @@ class MainWindow(QMainWindow):
             else:
                 print(f"[DEBUG] _set_active_item: Item {self.active_item.filename} était déjà sélectionné.")
 
+            self._load_adjustment_controls()
             self.active_item.set_interactive_opacity(True) # Mettre l'item actif en semi-transparent
             print(f"[DEBUG] _set_active_item: Item {self.active_item.filename} mis en opacité interactive.")
 
-            self.active_image_label.setText(f"Active: {self.active_item.filename}")
+            self._update_active_label()
 
             if self.active_item.scene():
                 other_pixmap_items_z = [
@@ -705,11 +2009,21 @@ class MainWindow(QMainWindow):
                 self.active_item.setZValue(new_z)
                 print(f"[DEBUG] _set_active_item: Item {self.active_item.filename} mis au Z-value {new_z}.")
         else:
-            self.active_image_label.setText("Aucune image active")
+            self._update_active_label()
             print("[DEBUG] _set_active_item: Aucune image active définie.")
 
         self.update_controls_state()
 
+    def _update_active_label(self):
+        if not self.active_item:
+            self.active_image_label.setText("Aucune image active")
+            return
+        others = len(self._selected_image_items()) - 1
+        if others > 0:
+            self.active_image_label.setText(f"Active: {self.active_item.filename} (+{others} sélectionnée(s))")
+        else:
+            self.active_image_label.setText(f"Active: {self.active_item.filename}")
+
     def _on_precise_mode_changed(self, state):
         self.is_precise_mode = state == Qt.CheckState.Checked.value # Pour Qt6
         # Ou pour Qt5/compatibilité: self.is_precise_mode = state == Qt.Checked
@@ -719,13 +2033,14 @@ class MainWindow(QMainWindow):
 
     def _on_rotation_changed(self, value):
         if self.active_item and not self.rotation_spinbox.signalsBlocked():
-            self.active_item.setRotation(value)
+            # La valeur affichée est celle de l'item actif ; le delta s'applique à toute la sélection
+            self.apply_group_transform(rotation_delta=value - self.active_item.rotation())
 
     def _on_scale_changed(self, value):
         if self.active_item and not self.scale_spinbox.signalsBlocked():
             # Assurer que l'échelle ne devienne pas nulle ou négative
             if value > 0:
-                self.active_item.setScale(value)
+                self.apply_group_transform(scale_factor=value / self.active_item.scale())
 
 
     def keyPressEvent(self, event):
@@ -739,37 +2054,31 @@ class MainWindow(QMainWindow):
 
         key = event.key()
 
-        # Mouvement
+        # Mouvement (appliqué à toute la sélection)
         if key == Qt.Key.Key_Up:
-            self.active_item.moveBy(0, -move_step)
+            self.apply_group_transform(dy=-move_step)
         elif key == Qt.Key.Key_Down:
-            self.active_item.moveBy(0, move_step)
+            self.apply_group_transform(dy=move_step)
         elif key == Qt.Key.Key_Left:
-            self.active_item.moveBy(-move_step, 0)
+            self.apply_group_transform(dx=-move_step)
         elif key == Qt.Key.Key_Right:
-            self.active_item.moveBy(move_step, 0)
+            self.apply_group_transform(dx=move_step)
 
         # Rotation (ex: avec R et T, ou PageUp/PageDown)
         elif key == Qt.Key.Key_R: # Rotation horaire
-            new_rotation = self.active_item.rotation() + rotate_step
-            self.active_item.setRotation(new_rotation)
-            self.rotation_spinbox.setValue(new_rotation % 360) # Mettre à jour spinbox
+            self.apply_group_transform(rotation_delta=rotate_step)
         elif key == Qt.Key.Key_E: # Rotation anti-horaire (E comme 'Everse')
-            new_rotation = self.active_item.rotation() - rotate_step
-            self.active_item.setRotation(new_rotation)
-            self.rotation_spinbox.setValue(new_rotation % 360)
+            self.apply_group_transform(rotation_delta=-rotate_step)
 
-        # Échelle (ex: avec + et -)
+        # Échelle (ex: avec + et -), relative à l'échelle de l'item actif
         elif key == Qt.Key.Key_Plus or key == Qt.Key.Key_Equal: # Souvent ensemble sur les claviers
             current_scale = self.active_item.scale()
             new_scale = max(0.01, current_scale + scale_step) # Empêcher échelle <= 0
-            self.active_item.setScale(new_scale)
-            self.scale_spinbox.setValue(new_scale)
+            self.apply_group_transform(scale_factor=new_scale / current_scale)
         elif key == Qt.Key.Key_Minus:
             current_scale = self.active_item.scale()
             new_scale = max(0.01, current_scale - scale_step)
-            self.active_item.setScale(new_scale)
-            self.scale_spinbox.setValue(new_scale)
+            self.apply_group_transform(scale_factor=new_scale / current_scale)
 
         # Naviguer entre les images avec Tab / Shift+Tab
         elif key == Qt.Key.Key_Tab:
@@ -779,8 +2088,9 @@ class MainWindow(QMainWindow):
 
         else:
             super().keyPressEvent(event) # Laisser les autres touches être gérées normalement
+            return
 
-        self.update_controls_state() # Mettre à jour les spinbox après modif clavier
+        # apply_group_transform a déjà rafraîchi les contrôles
 
     def select_next_image(self):
         if not self.image_items: return
@@ -791,6 +2101,7 @@ class MainWindow(QMainWindow):
             except ValueError: # Au cas où l'item actif n'est plus dans la liste (ne devrait pas arriver)
                 pass
         next_index = (current_index + 1) % len(self.image_items)
+        self.scene.clearSelection() # La navigation au clavier sélectionne une seule image
         self._set_active_item(self.image_items[next_index])
         self.thumbnail_list_widget.setCurrentRow(next_index)
 
@@ -803,60 +2114,525 @@ class MainWindow(QMainWindow):
             except ValueError:
                 pass
         prev_index = (current_index - 1 + len(self.image_items)) % len(self.image_items)
+        self.scene.clearSelection() # La navigation au clavier sélectionne une seule image
         self._set_active_item(self.image_items[prev_index])
         self.thumbnail_list_widget.setCurrentRow(prev_index)
 
+    def harmonize_colors(self):
+        """
+        Harmonise couleur et exposition de tous les calques sur l'image active (référence).
+        Les statistiques Lab sont calculées en parallèle sur des copies réduites, puis
+        chaque calque reçoit une table de correspondance appliquée via le curseur.
+        """
+        if not self.image_items:
+            self.status_bar.showMessage("Aucune image à harmoniser.", 3000)
+            return
+        reference = self.active_item or self.image_items[0]
+        self.harmonize_reference = reference
+        print(f"[DEBUG] harmonize_colors: Référence: {reference.filename}")
+
+        # Statistiques calculées sur les proxys (déjà réduits)
+        all_stats = list(self.worker_pool.map(
+            lambda item: compute_lab_stats(item.proxy_cv_image), self.image_items
+        ))
+        ref_stats = all_stats[self.image_items.index(reference)]
+        for item, stats in zip(self.image_items, all_stats):
+            item.harmonize_stats = stats
+            item.harmonize_target = ref_stats
+            print(f"[DEBUG] harmonize_colors: {item.filename}: mean Lab {stats[0]}, std Lab {stats[1]}")
+
+        self.harmonize_slider.setEnabled(True)
+        if self.harmonize_slider.value() == 100:
+            self._on_harmonize_strength_changed(100)
+        else:
+            self.harmonize_slider.setValue(100) # Déclenche _on_harmonize_strength_changed
+        self.status_bar.showMessage(f"Couleurs harmonisées sur {reference.filename}", 3000)
+
+    def _on_harmonize_strength_changed(self, value):
+        for item in self.image_items:
+            item.harmonize_strength = value / 100.0
+        self._refresh_item_pixmaps(self.image_items)
+
+    def auto_layout(self):
+        """
+        Dispose toutes les images selon le mode choisi dans le panneau de contrôle.
+        Seules les dimensions des calques sont utilisées ; rotation remise à zéro.
+        """
+        if not self.image_items:
+            self.status_bar.showMessage("Aucune image à disposer.", 3000)
+            return
+        mode = self.layout_mode_combo.currentData()
+        sizes = [item.pixmap().deviceIndependentSize().toTuple() for item in self.image_items]
+        placements = compute_layout(
+            sizes, mode,
+            aspect_ratio=self.layout_aspect_spinbox.value(),
+            spacing=self.layout_spacing_spinbox.value(),
+            uniform_scale=self.layout_uniform_checkbox.isChecked(),
+        )
+        print(f"[DEBUG] auto_layout: mode {mode}, {len(placements)} image(s).")
+
+        viewport = self.view.viewport()
+        viewport.setUpdatesEnabled(False)
+        try:
+            for item, (x, y, item_scale) in zip(self.image_items, placements):
+                item.setRotation(0)
+                item.setScale(item_scale)
+                # L'échelle s'applique autour du centre : compenser pour placer le coin supérieur gauche en (x, y)
+                origin = item.transformOriginPoint()
+                item.setPos(x - origin.x() * (1 - item_scale), y - origin.y() * (1 - item_scale))
+        finally:
+            viewport.setUpdatesEnabled(True)
+
+        self.view.setSceneRect(self.scene.itemsBoundingRect())
+        viewport.update()
+        self.update_controls_state()
+
+    def _load_adjustment_controls(self):
+        """ Affiche dans les contrôles la pile d'ajustements de l'image active. """
+        item = self.active_item
+        crop = item.adjustment_params('crop') or {}
+        resize = item.adjustment_params('resize') or {}
+        brightness_contrast = item.adjustment_params('brightness_contrast') or {}
+        blur = item.adjustment_params('blur') or {}
+        sharpen = item.adjustment_params('sharpen') or {}
+        values = {
+            'resize': resize.get('factor', 1.0),
+            'brightness': brightness_contrast.get('brightness', 0),
+            'contrast': brightness_contrast.get('contrast', 1.0),
+            'blur': blur.get('sigma', 0),
+            'sharpen': sharpen.get('amount', 0),
+        }
+        for side in ('left', 'top', 'right', 'bottom'):
+            values['crop_' + side] = crop.get(side, 0) * 100
+        for key, spinbox in self.adjustment_spinboxes.items():
+            spinbox.blockSignals(True)
+            spinbox.setValue(values[key])
+            spinbox.blockSignals(False)
+
+    def _on_adjustment_changed(self, value):
+        """ Reconstruit la pile d'ajustements de l'image active à partir des contrôles. """
+        if not self.active_item:
+            return
+        v = {key: spinbox.value() for key, spinbox in self.adjustment_spinboxes.items()}
+        adjustments = {}
+        crop = {side: v['crop_' + side] / 100.0 for side in ('left', 'top', 'right', 'bottom')}
+        if any(crop.values()):
+            adjustments['crop'] = crop
+        if v['resize'] != 1.0:
+            adjustments['resize'] = {'factor': v['resize']}
+        if v['brightness'] != 0 or v['contrast'] != 1.0:
+            adjustments['brightness_contrast'] = {'brightness': v['brightness'], 'contrast': v['contrast']}
+        if v['blur'] > 0:
+            adjustments['blur'] = {'sigma': v['blur']}
+        if v['sharpen'] > 0:
+            adjustments['sharpen'] = {'amount': v['sharpen']}
+        self.active_item.set_adjustments(adjustments)
+        print(f"[DEBUG] _on_adjustment_changed: {self.active_item.filename}: {self.active_item.adjustments}")
+        self._refresh_item_pixmaps([self.active_item])
+
+    def _refresh_item_pixmaps(self, items):
+        """ Recalcule l'aperçu (proxy) des calques donnés et met à jour pixmaps et miniatures. """
+        items = list(items)
+        if not items:
+            return
+        # Pipelines en parallèle ; la création des QPixmap reste dans le thread GUI
+        rgb_images = list(self.worker_pool.map(lambda item: item.render_rgb(), items))
+        viewport = self.view.viewport()
+        viewport.setUpdatesEnabled(False)
+        try:
+            for item, rgb_image in zip(items, rgb_images):
+                item.set_display_rgb(rgb_image)
+                self._update_thumbnail(item)
+        finally:
+            viewport.setUpdatesEnabled(True)
+        viewport.update()
+
+    def _on_watch_toggled(self, enabled):
+        if enabled:
+            for item in self.image_items:
+                self._watch_item_source(item)
+            self.status_bar.showMessage("Surveillance des fichiers sources activée", 2000)
+        else:
+            self._unwatch_all_sources()
+            self.status_bar.showMessage("Surveillance des fichiers sources désactivée", 2000)
+
+    def _watch_item_source(self, item):
+        if item.source_path and item.source_path not in self.file_watcher.files():
+            self.file_watcher.addPath(item.source_path)
+
+    def _unwatch_all_sources(self):
+        if self.file_watcher.files():
+            self.file_watcher.removePaths(self.file_watcher.files())
+        if self.file_watcher.directories():
+            self.file_watcher.removePaths(self.file_watcher.directories())
+        self._missing_sources.clear()
+        for timer in self._reload_timers.values():
+            timer.stop()
+        self._reload_timers.clear()
+        self._reload_generations.clear() # Les rechargements en cours seront ignorés
+
+    def _on_source_file_changed(self, path):
+        """ Anti-rebond : une rafale d'écritures ne déclenche qu'un seul rechargement. """
+        timer = self._reload_timers.get(path)
+        if timer is None:
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.setInterval(FILE_WATCH_DEBOUNCE_MS)
+            timer.timeout.connect(lambda p=path: self._reload_source(p))
+            self._reload_timers[path] = timer
+        timer.start() # Redémarre le délai à chaque événement
+
+    def _watch_missing_source(self, path):
+        """
+        QFileSystemWatcher cesse de surveiller un fichier supprimé ou renommé : on surveille
+        alors son répertoire parent jusqu'à ce que le fichier réapparaisse.
+        """
+        self._missing_sources.add(path)
+        directory = os.path.dirname(path)
+        if os.path.isdir(directory) and directory not in self.file_watcher.directories():
+            self.file_watcher.addPath(directory)
+        print(f"[DEBUG] _watch_missing_source: {path} absent, surveillance de {directory}")
+
+    def _on_source_directory_changed(self, directory):
+        if not self.watch_action.isChecked():
+            return
+        for path in [p for p in self._missing_sources if os.path.dirname(p) == directory]:
+            if os.path.exists(path):
+                self._missing_sources.discard(path)
+                self.file_watcher.addPath(path)
+                self._on_source_file_changed(path) # Rechargement avec anti-rebond
+        # Plus aucun fichier attendu dans ce répertoire : arrêter de le surveiller
+        if not any(os.path.dirname(p) == directory for p in self._missing_sources):
+            self.file_watcher.removePath(directory)
+
+    def _reload_source(self, path):
+        if not self.watch_action.isChecked():
+            return
+        if not os.path.exists(path):
+            # Fichier supprimé (ou en cours de remplacement) : attendre sa réapparition
+            self._watch_missing_source(path)
+            return
+        # Beaucoup d'éditeurs remplacent le fichier (écriture + renommage) : le watcher le perd
+        if path not in self.file_watcher.files():
+            self.file_watcher.addPath(path)
+
+        items = [item for item in self.image_items if item.source_path == path]
+        if not items:
+            return
+        generation = self._reload_generations.get(path, 0) + 1
+        self._reload_generations[path] = generation
+        keep_depth = self.high_depth_action.isChecked()
+        is_reference = self.harmonize_reference in items
+        # Instantané (thread GUI) de ce qu'il faut pour calculer les aperçus dans le worker
+        snapshots = [(item.harmonize_stats is not None, item.harmonize_target,
+                      item.harmonize_strength, list(item.adjustments)) for item in items]
+        # Si la référence change, les autres calques harmonisés doivent viser ses nouvelles statistiques
+        dependents = [item for item in self.image_items
+                      if is_reference and item not in items and item.harmonize_target is not None]
+        dependent_snapshots = [(item.proxy_cv_image, item.proxy_scale, item.source_id, item.harmonize_stats,
+                                item.harmonize_strength, list(item.adjustments)) for item in dependents]
+        print(f"[DEBUG] _reload_source: Rechargement de {path} (génération {generation})")
+
+        def decode():
+            # Décodage, proxy, statistiques et aperçus : tout le travail lourd est fait ici
+            image = read_source_image(path, keep_depth)
+            if image is None:
+                return None
+            image = normalize_source_depth(image)
+            proxy, proxy_scale = prepare_source(image)
+            source_id = next(_SOURCE_IDS)
+            stats = compute_lab_stats(proxy)
+            # Chaque aperçu est livré avec les étapes qui l'ont produit, comparées à l'arrivée
+            previews = []
+            for harmonized, target, strength, adjustments in snapshots:
+                stages = build_pipeline_stages(stats if harmonized else None,
+                                               stats if is_reference else target,
+                                               strength, adjustments)
+                previews.append((stages, cv2.cvtColor(run_pipeline(proxy, proxy_scale, source_id, stages),
+                                                      cv2.COLOR_BGR2RGB)))
+            dependent_previews = []
+            for dep_proxy, dep_scale, dep_id, dep_stats, strength, adjustments in dependent_snapshots:
+                stages = build_pipeline_stages(dep_stats, stats, strength, adjustments)
+                dependent_previews.append((dep_id, stages, cv2.cvtColor(
+                    run_pipeline(dep_proxy, dep_scale, dep_id, stages), cv2.COLOR_BGR2RGB)))
+            return {'image': image, 'proxy': proxy, 'proxy_scale': proxy_scale, 'source_id': source_id,
+                    'stats': stats, 'items': items, 'previews': previews,
+                    'dependents': dependents, 'dependent_previews': dependent_previews}
+
+        def done(future):
+            # Le résultat revient au thread GUI par signal
+            if future.cancelled():
+                return # Pool arrêté à la fermeture de la fenêtre
+            error = future.exception()
+            if error is not None:
+                print(f"[ERREUR] _reload_source: {path}: {error}")
+            self.sourceReloaded.emit(path, generation, future.result() if error is None else None)
+
+        self.worker_pool.submit(decode).add_done_callback(done)
+
+    def _on_source_reloaded(self, path, generation, result):
+        if self._reload_generations.get(path) != generation:
+            return # Rechargement obsolète (un plus récent est en cours) ou surveillance arrêtée
+        if result is None:
+            self.status_bar.showMessage(f"Impossible de recharger {os.path.basename(path)}", 5000)
+            return
+        # Le thread GUI ne fait qu'échanger les tampons préparés par le worker
+        reloaded = [item for item in result['items'] if item in self.image_items]
+        stale = []
+        for item, (_, preview_rgb) in zip(result['items'], result['previews']):
+            if item not in reloaded:
+                continue
+            item.replace_source(result['image'], result['proxy'], result['proxy_scale'],
+                                result['source_id'], result['stats'], preview_rgb)
+
+        if self.harmonize_reference in reloaded:
+            # La référence a changé : tous les calques harmonisés visent ses nouvelles statistiques
+            for item in self.image_items:
+                if item.harmonize_target is not None:
+                    item.harmonize_target = result['stats']
+            for item, (source_id, stages, preview_rgb) in zip(result['dependents'], result['dependent_previews']):
+                if item not in self.image_items:
+                    continue
+                if item.source_id != source_id or item.pipeline_stages() != stages:
+                    stale.append(item) # Source ou réglages modifiés entre-temps : aperçu à recalculer
+                    continue
+                item.set_display_rgb(preview_rgb)
+                self._update_thumbnail(item)
+
+        # Ajustements ou harmonisation modifiés pendant le décodage : l'aperçu préparé est périmé
+        for item, (stages, preview_rgb) in zip(result['items'], result['previews']):
+            if item not in reloaded:
+                continue
+            if item.pipeline_stages() != stages:
+                stale.append(item)
+            else:
+                self._update_thumbnail(item)
+        self._refresh_item_pixmaps(stale)
+
+        if reloaded:
+            self.view.viewport().update()
+            self.status_bar.showMessage(f"Image rechargée: {os.path.basename(path)}", 3000)
+
+    def _update_thumbnail(self, graphic_item):
+        for i in range(self.thumbnail_list_widget.count()):
+            list_item = self.thumbnail_list_widget.item(i)
+            if list_item.data(Qt.ItemDataRole.UserRole) is graphic_item:
+                thumbnail_pixmap = graphic_item.pixmap().scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+                                                                Qt.AspectRatioMode.KeepAspectRatio,
+                                                                Qt.TransformationMode.SmoothTransformation)
+                thumbnail_pixmap.setDevicePixelRatio(1.0)
+                list_item.setIcon(QIcon(thumbnail_pixmap))
+                break
+
     def export_composition(self):
         if not self.image_items:
             self.status_bar.showMessage("Aucune image à exporter.", 3000)
             return
 
         # Déterminer la zone à exporter. On prend le rectangle englobant tous les items.
-        # Pour une "haute résolution", il faudrait idéalement retravailler avec les images OpenCV originales.
-        # Pour l'instant, on exporte ce qui est visible dans la scène.
         export_rect = self.scene.itemsBoundingRect()
         if export_rect.isEmpty():
             self.status_bar.showMessage("La scène est vide.", 3000)
             return
 
-        # S'assurer que les dimensions ne sont pas trop grandes pour QImage,
-        # ou gérer cela par tuiles si nécessaire pour de très grandes images.
-        # Pour l'instant, on suppose que ça tient en mémoire.
+        # Choisir le fichier d'abord : le format détermine la profondeur du rendu
+        filePath, selected_filter = QFileDialog.getSaveFileName(
+            self, "Exporter l'Image Composite", "", ";;".join(COMPOSITE_EXPORT_FORMATS)
+        )
+        if not filePath:
+            return
+        if not os.path.splitext(filePath)[1]:
+            # OpenCV choisit l'encodeur d'après l'extension
+            filePath += {'PNG': '.png', 'JPE': '.jpg'}.get(selected_filter[:3], '.tif')
+        self._export_composite(filePath, COMPOSITE_EXPORT_FORMATS.get(selected_filter, np.uint8))
 
-        # Créer une image de la taille du rectangle englobant
-        target_image = QImage(export_rect.size().toSize(), QImage.Format.Format_ARGB32_Premultiplied)
-        target_image.fill(Qt.GlobalColor.transparent) # Fond transparent
+    def _export_composite(self, filePath, dtype):
+        """
+        Export composite en 8 bits, 16 bits ou flottant, calculé avec OpenCV directement sur
+        les originaux (sans passer par le rendu de la scène), un calque à la fois et dans le
+        budget COMPOSITE_EXPORT_MAX_BYTES.
+        """
+        # Estimation mémoire : canevas flottant (16 o/px) + sortie BGRA, plus le pic d'un calque :
+        # deux rendus pleine résolution (courant + suivant, BGR flottant au pire, 12 o/px), la copie
+        # BGRA du courant (16 o/px) et sa projection avec les temporaires du mélange (~64 o/px)
+        canvas_rect = QRectF(self.image_items[0].sceneBoundingRect())
+        for item in self.image_items[1:]:
+            canvas_rect = canvas_rect.united(item.sceneBoundingRect())
+        canvas_x, canvas_y = math.floor(canvas_rect.left()), math.floor(canvas_rect.top())
+        canvas_w = math.ceil(canvas_rect.right()) - canvas_x
+        canvas_h = math.ceil(canvas_rect.bottom()) - canvas_y
+        largest_source = max(math.ceil(item.boundingRect().width()) * math.ceil(item.boundingRect().height())
+                             for item in self.image_items)
+        largest_layer = max(math.ceil(item.sceneBoundingRect().width()) * math.ceil(item.sceneBoundingRect().height())
+                            for item in self.image_items)
+        estimated_bytes = (canvas_w * canvas_h * (16 + 4 * np.dtype(dtype).itemsize)
+                           + largest_source * (2 * 12 + 16) + min(largest_layer, canvas_w * canvas_h) * 64)
+        print(f"[DEBUG] _export_composite: {np.dtype(dtype).name}, mémoire estimée {estimated_bytes / 2**20:.0f} Mo")
+        if estimated_bytes > COMPOSITE_EXPORT_MAX_BYTES:
+            self.status_bar.showMessage(
+                f"Export annulé : {estimated_bytes / 2**20:.0f} Mo nécessaires "
+                f"(limite {COMPOSITE_EXPORT_MAX_BYTES / 2**20:.0f} Mo).", 7000
+            )
+            return
 
-        painter = QPainter(target_image)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        # Géométrie lue dans le thread GUI ; chaque calque est rendu sur son original juste avant
+        # d'être composé (sans ajustement, l'original est utilisé sans copie)
+        layers = []
+        for item in sorted(self.image_items, key=lambda itm: itm.zValue()):
+            t = item.sceneTransform()
+            layers.append((lambda item=item: item.render_bgr(full_resolution=True),
+                           np.array([[t.m11(), t.m21(), t.dx()],
+                                     [t.m12(), t.m22(), t.dy()]], np.float64)))
+        try:
+            composite = composite_layers(layers, dtype, (canvas_x, canvas_y, canvas_w, canvas_h), self.worker_pool)
+            if os.path.splitext(filePath)[1].lower() in ('.jpg', '.jpeg'):
+                # JPEG sans transparence : aplatissement sur la couleur de fond de la scène
+                background = self.scene.backgroundBrush().color()
+                alpha = composite[:, :, 3:4].astype(np.float32) * (1.0 / 255.0)
+                color = np.array([background.blue(), background.green(), background.red()], np.float32)
+                composite = np.clip(composite[:, :, :3] * alpha + color * (1.0 - alpha) + 0.5, 0, 255).astype(np.uint8)
+            if not cv2.imwrite(filePath, composite):
+                raise IOError("OpenCV n'a pas pu écrire le fichier.")
+        except Exception as e:
+            self.status_bar.showMessage(f"Erreur lors de la sauvegarde de l'image: {filePath} ({e})", 5000)
+            print(f"[ERREUR] _export_composite: {e}")
+            return
+        self.status_bar.showMessage(f"Image {np.dtype(dtype).name} sauvegardée: {filePath}", 3000)
 
-        # Rendre la scène sur notre image. La source est export_rect, la target est le QRect(0,0, w,h) de l'image
-        self.scene.render(painter, QRectF(target_image.rect()), export_rect)
-        painter.end()
+    def export_layers(self):
+        """
+        Exporte chaque image comme un calque OpenRaster : projetée dans l'espace du canevas
+        (position, échelle, rotation), recadrée sur son propre rectangle englobant, avec
+        son décalage et son Z-order. Les calques sont calculés sur les originaux.
+        """
+        if not self.image_items:
+            self.status_bar.showMessage("Aucune image à exporter.", 3000)
+            return
 
-        # Sauvegarder l'image
         filePath, _ = QFileDialog.getSaveFileName(
-            self, "Exporter l'Image Composite", "", "PNG Image (*.png);;JPEG Image (*.jpg)"
+            self, "Exporter en calques", "", "OpenRaster (*.ora)"
         )
-
-        if filePath:
-            if not target_image.save(filePath):
-                self.status_bar.showMessage(f"Erreur lors de la sauvegarde de l'image: {filePath}", 5000)
-            else:
-                self.status_bar.showMessage(f"Image sauvegardée: {filePath}", 3000)
+        if not filePath:
+            return
+        if not filePath.lower().endswith('.ora'):
+            filePath += '.ora'
+
+        canvas_rect = QRectF(self.image_items[0].sceneBoundingRect())
+        for item in self.image_items[1:]:
+            canvas_rect = canvas_rect.united(item.sceneBoundingRect())
+        canvas_x, canvas_y = math.floor(canvas_rect.left()), math.floor(canvas_rect.top())
+        canvas_size = (math.ceil(canvas_rect.right()) - canvas_x, math.ceil(canvas_rect.bottom()) - canvas_y)
+
+        # Géométrie lue dans le thread GUI ; rendu et encodage dans les threads de travail
+        layers = []
+        for item in sorted(self.image_items, key=lambda itm: itm.zValue()):
+            rect = item.sceneBoundingRect()
+            x0, y0 = math.floor(rect.left()), math.floor(rect.top())
+            size = (math.ceil(rect.right()) - x0, math.ceil(rect.bottom()) - y0)
+            t = item.sceneTransform()
+            matrix = [[t.m11(), t.m21(), t.dx() - x0],
+                      [t.m12(), t.m22(), t.dy() - y0]]
+            render = (lambda itm=item, m=matrix, sz=size:
+                      render_layer_png(itm.render_bgr(full_resolution=True), m, sz))
+            layers.append((item.filename, x0 - canvas_x, y0 - canvas_y, render))
+
+        # Image aplatie à la taille du canevas, rendue à partir des proxys (suffisant pour un aperçu)
+        merged_rect = QRectF(canvas_x, canvas_y, *canvas_size)
+        merged_png = self._render_scene_png(merged_rect, QSize(*canvas_size))
+        try:
+            write_openraster(filePath, canvas_size, layers, self.worker_pool, merged_png,
+                             thumbnail_png=self._render_thumbnail_png(canvas_rect))
+        except Exception as e:
+            self.status_bar.showMessage(f"Erreur lors de l'export en calques: {e}", 5000)
+            print(f"[ERREUR] export_layers: {e}")
+            return
+        self.status_bar.showMessage(f"Calques exportés: {filePath}", 3000)
+
+    def _render_thumbnail_png(self, source_rect):
+        """ Aperçu réduit de la scène (à partir des proxys), encodé en PNG. """
+        thumbnail_size = source_rect.size().scaled(ORA_THUMBNAIL_SIZE, ORA_THUMBNAIL_SIZE,
+                                                   Qt.AspectRatioMode.KeepAspectRatio).toSize()
+        return self._render_scene_png(source_rect, thumbnail_size)
+
+    def _render_scene_png(self, source_rect, size):
+        """ Rendu de la zone `source_rect` de la scène (à partir des proxys) en image de `size`, encodé en PNG. """
+        image = QImage(size, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(Qt.GlobalColor.transparent)
+        # Ni fond gris, ni cadres de sélection, ni semi-transparence de l'item actif dans l'image exportée
+        selected = self.scene.selectedItems()
+        background = self.scene.backgroundBrush()
+        translucent = self.active_item if self.active_item is not None and self.active_item.opacity() < 1.0 else None
+        self.scene.blockSignals(True)
+        try:
+            for item in selected:
+                item.setSelected(False)
+            if translucent is not None:
+                translucent.set_interactive_opacity(False)
+            self.scene.setBackgroundBrush(Qt.BrushStyle.NoBrush)
+            painter = QPainter(image)
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+            self.scene.render(painter, QRectF(image.rect()), source_rect)
+            painter.end()
+        finally:
+            if translucent is not None:
+                translucent.set_interactive_opacity(True)
+            self.scene.setBackgroundBrush(background)
+            for item in selected:
+                item.setSelected(True)
+            self.scene.blockSignals(False)
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        image.save(buffer, "PNG")
+        buffer.close()
+        return bytes(data)
 
     def closeEvent(self, event):
         # Ici, vous pourriez ajouter une confirmation si des modifications non sauvegardées existent
+        self._stop_video_extraction()
+        self._unwatch_all_sources()
+        self.worker_pool.shutdown(wait=False, cancel_futures=True)
         super().closeEvent(event)
 
     def _on_item_manipulated(self, item):
-        """Appelé lorsque l'item actif est manipulé par des actions personnalisées."""
-        if item == self.active_item:
+        """Appelé lorsque l'item actif (ou un item de la sélection) est manipulé par des actions personnalisées."""
+        if item == self.active_item or item.isSelected():
             print(f"[DEBUG] MainWindow: _on_item_manipulated pour {item.filename}")
             self.update_controls_state() # Cela mettra à jour les spinbox
 
+def self_check_pipeline_depth():
+    """
+    Vérifie qu'un petit original 16 bits (proxy à l'échelle 1.0) avec un ajustement reste en
+    16 bits en pleine résolution après le rendu de son aperçu 8 bits (clés de cache distinctes).
+    """
+    STAGE_CACHE.clear()
+    original = np.full((300, 400, 3), 30000, np.uint16)
+    proxy, proxy_scale = prepare_source(original)
+    source_id = next(_SOURCE_IDS)
+    stages = [('brightness_contrast', {'brightness': 1, 'contrast': 1.0})]
+    preview = run_pipeline(proxy, proxy_scale, source_id, stages)
+    full = run_pipeline(original, 1.0, source_id, stages)
+    STAGE_CACHE.clear()
+    if proxy_scale != 1.0 or preview.dtype != np.uint8 or full.dtype != np.uint16:
+        raise AssertionError(f"profondeurs inattendues : aperçu {preview.dtype}, original {full.dtype}")
+    print("[DEBUG] self_check_pipeline_depth: OK")
+
+
 if __name__ == '__main__':
+    if '--self-check' in sys.argv:
+        # Vérifications rapides sans interface : python main.py --self-check
+        self_check_pipeline_depth()
+        sys.exit(0)
+    if '--serve' in sys.argv:
+        # Mode service : python main.py --serve [port] [--output-dir RÉPERTOIRE]
+        args = sys.argv[sys.argv.index('--serve') + 1:]
+        output_dir = None
+        if '--output-dir' in args:
+            index = args.index('--output-dir')
+            output_dir = args[index + 1]
+            del args[index:index + 2]
+        serve_render_service(int(args[0]) if args else RENDER_SERVICE_PORT, output_dir=output_dir)
+        sys.exit(0)
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()